@@ -126,17 +126,17 @@ class MuZeroAtariNetwork:
         flat = Flatten()(latent_state)
         latent_state = MinMaxScaler()(latent_state)
 
-        r = Dense(self.args.support_size * 2 + 1, name='r')(flat)
+        r = Dense(self.args.support_size * 2 + 1, name='r', dtype='float32')(flat)
         if not self.args.support_size:
-            r = Activation('softmax')(r)
+            r = Activation('softmax', dtype='float32')(r)
 
         return r, latent_state
 
     def build_predictor(self, latent_state):
         out_tensor = self.crafter.build_conv_block(latent_state, use_bn=False)
 
-        pi = Dense(self.action_size, activation='softmax', name='pi')(out_tensor)
-        v = Dense(self.args.support_size * 2 + 1, name='v')(out_tensor)
-        v = Activation('softmax')(v) if self.args.support_size else Activation('tanh')(v)
+        pi = Dense(self.action_size, activation='softmax', name='pi', dtype='float32')(out_tensor)
+        v = Dense(self.args.support_size * 2 + 1, name='v', dtype='float32')(out_tensor)
+        v = Activation('softmax' if self.args.support_size else 'tanh', dtype='float32')(v)
 
         return pi, v
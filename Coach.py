@@ -14,10 +14,11 @@ import sys
 import typing
 from pickle import Pickler, Unpickler, HIGHEST_PROTOCOL
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from abc import ABC, abstractmethod
 
 import numpy as np
-from tqdm import trange
+from tqdm import tqdm
 
 from Experimenter import Arena
 from utils import DotDict
@@ -82,6 +83,20 @@ class Coach(ABC):
         :return: List of training examples.
         """
 
+    def sampleBatches(self, histories: typing.List[GameHistory], n: int) -> typing.Iterator:
+        """
+        Yield 'n' batches of data sampled from the current replay buffer for consecutive weight updates.
+
+        The default implementation calls sampleBatch sequentially on demand. Override this method in order to
+        prepare batches asynchronously to the weight updates.
+
+        :param histories: List of GameHistory objects. Contains all game-trajectories in the replay-buffer.
+        :param n: int Number of batches to sample.
+        :return: Iterator over the training examples of each batch.
+        """
+        for _ in range(n):
+            yield self.sampleBatch(histories)
+
     def executeEpisode(self) -> GameHistory:
         """
         Perform one episode of self-play for gathering data to train neural networks on.
@@ -126,6 +141,39 @@ class Coach(ABC):
 
         return history
 
+    def executeEpisodes(self, n: int) -> typing.Iterator[GameHistory]:
+        """
+        Yield 'n' episodes of self-play data.
+
+        The default implementation plays the episodes sequentially with executeEpisode. Override this method in
+        order to play multiple episodes concurrently.
+
+        :param n: int Number of episodes to play.
+        :return: Iterator over the GameHistory objects of each finished episode.
+        """
+        for _ in range(n):
+            self.mcts.clear_tree()
+            yield self.executeEpisode()
+
+    def selfPlay(self, progress_bar: bool = True) -> typing.List[GameHistory]:
+        """
+        Gather the training data of one self-play iteration by playing 'num_episodes' episodes. If the data exceeds
+        'max_buffer_size' steps, the oldest episodes are discarded.
+
+        :param progress_bar: bool Whether to display the progress of the self-play iteration.
+        :return: List of GameHistory objects of the played episodes.
+        """
+        iteration_train_examples = list()
+        episodes = self.executeEpisodes(self.args.num_episodes)
+        for history in tqdm(episodes, total=self.args.num_episodes, desc="Self Play", file=sys.stdout,
+                            disable=not progress_bar):
+            iteration_train_examples.append(history)
+
+            if sum(map(len, iteration_train_examples)) > self.args.max_buffer_size:
+                iteration_train_examples.pop(0)
+
+        return iteration_train_examples
+
     def learn(self) -> None:
         """
         Control the data gathering and weight optimization loop. Perform 'num_selfplay_iterations' iterations
@@ -134,19 +182,23 @@ class Coach(ABC):
         against the newly fitted neural network weights, the newly fitted weights are then accepted based on some
         specified win/ lose ratio. Neural network weights and the replay buffer are stored after every iteration.
         Note that for highly granular vision based environments, that the replay buffer may grow to large sizes.
+
+        If 'concurrent_selfplay' is specified, the self-play data of the next iteration is gathered in a background
+        thread during backpropagation, using the network as it is being trained. The thread is joined before pitting.
         """
+        concurrent = self.args.get('concurrent_selfplay', False)
+        executor = ThreadPoolExecutor(max_workers=1) if concurrent else None
+        next_selfplay = None
+
         for i in range(1, self.args.num_selfplay_iterations + 1):
             print(f'------ITER {i}------')
             if not self.update_on_checkpoint or i > 1:  # else: go directly to backpropagation
 
-                # Self-play/ Gather training data.
-                iteration_train_examples = list()
-                for _ in trange(self.args.num_episodes, desc="Self Play", file=sys.stdout):
-                    self.mcts.clear_tree()
-                    iteration_train_examples.append(self.executeEpisode())
-
-                    if sum(map(len, iteration_train_examples)) > self.args.max_buffer_size:
-                        iteration_train_examples.pop(0)
+                # Self-play/ Gather training data (or collect the data gathered during the previous iteration).
+                if next_selfplay is not None:
+                    iteration_train_examples = next_selfplay.result()
+                else:
+                    iteration_train_examples = self.selfPlay()
 
                 # Store data from previous self-play iterations into the history.
                 self.trainExamplesHistory.append(iteration_train_examples)
@@ -161,13 +213,20 @@ class Coach(ABC):
             # Training new network, keeping a copy of the old one
             self.neural_net.save_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
 
-            # Backpropagation
-            for _ in trange(self.args.num_gradient_steps, desc="Backpropagation", file=sys.stdout):
-                batch = self.sampleBatch(complete_history)
+            # Overlap the self-play of the next iteration with the backpropagation.
+            next_selfplay = None
+            if concurrent and i < self.args.num_selfplay_iterations:
+                next_selfplay = executor.submit(self.selfPlay, False)
 
+            # Backpropagation
+            batches = self.sampleBatches(complete_history, self.args.num_gradient_steps)
+            for batch in tqdm(batches, total=self.args.num_gradient_steps, desc="Backpropagation", file=sys.stdout):
                 self.neural_net.train(batch)
                 self.neural_net.monitor.log_batch(batch)
 
+            if next_selfplay is not None:
+                wait([next_selfplay])  # The search engine and network weights must be idle for pitting.
+
             # Pitting
             accept = True
             if self.args.pitting:
@@ -186,6 +245,9 @@ class Coach(ABC):
                 print('REJECTING NEW MODEL')
                 self.neural_net.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
 
+        if executor is not None:
+            executor.shutdown()
+
     def saveTrainExamples(self, iteration: int) -> None:
         """
         Store the current accumulated data to a compressed file using pickle. Note that for highly dimensional
@@ -14,8 +14,9 @@ import tensorflow as tf
 from Coach import Coach
 from Agents import DefaultMuZeroPlayer
 from MuZero.MuMCTS import MuZeroMCTS
+from MuZero.MuSelfPlay import execute_episodes_parallel
 from utils import DotDict
-from utils.selfplay_utils import GameHistory, sample_batch
+from utils.selfplay_utils import GameHistory, TrajectoryBuffer, sample_batch
 
 
 class MuZeroCoach(Coach):
@@ -34,9 +35,19 @@ class MuZeroCoach(Coach):
         :param neural_net: MuNeuralNet Implementation of MuNeuralNet class for inference.
         :param args: DotDict Data structure containing parameters for self-play.
         :param run_name: str Optionally provide a run-name for the TensorBoard log-files. Default is current datetime.
+        :raises: NotImplementedError if both 'concurrent_selfplay' and 'num_selfplay_workers' > 1 are specified.
         """
+        # Self-play workers are forked, which is unsafe while the tf.data threads of the backpropagation are running.
+        if args.get('concurrent_selfplay', False) and args.get('num_selfplay_workers', 1) > 1:
+            raise NotImplementedError("Concurrent self-play cannot be combined with multiple self-play workers...")
+
         super().__init__(game, neural_net, args, MuZeroMCTS, DefaultMuZeroPlayer)
 
+        # The arena opponent only loads checkpoints. Calibrate its int8 inference on the training batches of the new
+        # network so that both players are quantized alike during pitting. See DefaultMuZero.get_recurrent_model.
+        if self.args.pitting:
+            self.opponent_net.calibration_net = self.neural_net
+
         # Initialize tensorboard logging.
         if run_name is None:
             run_name = datetime.now().strftime("%Y%m%d-%H%M%S")
@@ -48,9 +59,45 @@ class MuZeroCoach(Coach):
         # Define helper variables.
         self.return_forward_observations = (neural_net.net_args.dynamics_penalty > 0 or args.latent_decoder)
         self.observation_stack_length = neural_net.net_args.observation_length
+        self._action_size = game.getActionSize()
+        self._arange_k = np.arange(args.K + 1)
+
+        # Flattened replay buffer for batched sampling, rebuilt whenever sampleBatch receives a new list of histories.
+        self._buffer = None
+        self._buffer_source = None
 
-    def buildHypotheticalSteps(self, history: GameHistory, t: int, k: int) -> \
-            typing.Tuple[np.ndarray, typing.Tuple[np.ndarray, np.ndarray, np.ndarray], np.ndarray]:
+    def executeEpisodes(self, n: int) -> typing.Iterator[GameHistory]:
+        """
+        Yield 'n' episodes of self-play data.
+
+        If 'num_selfplay_workers' is larger than one, the episodes are played concurrently by forked worker processes
+        whose neural network queries are answered in batches by this process. See MuZero/MuSelfPlay.py.
+        Otherwise, the episodes are played sequentially.
+
+        :param n: int Number of episodes to play.
+        :return: Iterator over the GameHistory objects of each finished episode.
+        """
+        num_workers = min(self.args.get('num_selfplay_workers', 1), n)
+        if num_workers > 1:
+            return execute_episodes_parallel(self, n, num_workers)
+        return super().executeEpisodes(n)
+
+    def getBuffer(self, histories: typing.List[GameHistory]) -> TrajectoryBuffer:
+        """
+        Get the flattened TrajectoryBuffer of the given list of histories. The buffer is only rebuilt if this method
+        receives a different list object than in its previous call (i.e., once every backpropagation phase).
+
+        :param histories: List of GameHistory objects. Contains all game-trajectories in the replay-buffer.
+        :return: TrajectoryBuffer Contiguous representation of the data within histories.
+        """
+        if self._buffer_source is not histories:
+            self._buffer = TrajectoryBuffer.from_histories(histories)
+            self._buffer_source = histories
+
+        return self._buffer
+
+    def buildHypotheticalSteps(self, buffer: TrajectoryBuffer, h_i: np.ndarray, t: np.ndarray, k: int) -> \
+            typing.Tuple[np.ndarray, typing.Tuple[np.ndarray, np.ndarray, np.ndarray]]:
         """
         Sample/ extrapolate a sequence of targets for unrolling/ fitting the MuZero neural network.
 
@@ -69,41 +116,35 @@ class MuZeroCoach(Coach):
         in slower and more unstable learning as we're feeding wrong data to the neural networks. We found that not
         distributing any gradient at all to these extrapolated steps resulted in the best learning.
 
-        :param history: GameHistory Sampled data structure containing all statistics/ observations of a finished game.
-        :param t: int The sampled index to generate the targets at.
+        The sequences are built for the entire batch at once by gathering from the flat arrays of the buffer.
+
+        :param buffer: TrajectoryBuffer Flattened data of all finished games within the replay buffer.
+        :param h_i: np.ndarray Sampled indices of the trajectories within the buffer to generate the targets from.
+        :param t: np.ndarray The sampled time indices within each trajectory to generate the targets at.
         :param k: int The number of unrolling steps to perform/ length of the dynamics model target sequence.
-        :return: Tuple of (actions, targets, future_inputs) that the neural network needs for optimization
+        :return: Tuple of (actions, targets) that the neural network needs for optimization. Actions are integers.
         """
-        # One hot encode actions.
-        actions = history.actions[t:t+k]
-        a_truncation = k - len(actions)
-        if a_truncation > 0:  # Uniform policy when unrolling beyond terminal states.
-            actions += np.random.randint(self.game.getActionSize(), size=a_truncation).tolist()
-
-        enc_actions = np.zeros([k, self.game.getActionSize()])
-        enc_actions[np.arange(len(actions)), actions] = 1
-
-        # Value targets.
-        pis = history.probabilities[t:t+k+1]
-        vs = history.observed_returns[t:t+k+1]
-        rewards = history.rewards[t:t+k+1]
-
-        # Handle truncations > 0 due to terminal states. Treat last state as absorbing state
-        t_truncation = (k + 1) - len(pis)  # Target truncation due to terminal state
-        if t_truncation > 0:
-            pis += [np.zeros_like(pis[-1])] * t_truncation  # Zero vector
-            rewards += [0] * t_truncation                   # = 0
-            vs += [0] * t_truncation                        # = 0
+        batch_size = len(h_i)
+        window = t[:, None] + self._arange_k[:k + 1]  # (batch_size, k + 1)
 
-        # If specified, also sample/ extrapolate future observations. Otherwise return an empty array.
-        obs_trajectory = []
-        if self.return_forward_observations:
-            obs_trajectory = [history.stackObservations(self.observation_stack_length, t=t+i+1) for i in range(k)]
+        # Integer actions, encoded in-graph by the neural network. Uniform policy when unrolling beyond terminal states.
+        a_valid = window[:, :k] < buffer.lengths[h_i][:, None]
+        a_indices = buffer.step_offsets[h_i][:, None] + np.minimum(window[:, :k], (buffer.lengths[h_i] - 1)[:, None])
+        actions = np.where(a_valid, np.take(buffer.actions, a_indices),
+                           np.random.randint(self._action_size, size=(batch_size, k))).astype(np.int32)
 
-        # (Actions, Targets, Observations)
-        return enc_actions, (np.asarray(vs), np.asarray(rewards), np.asarray(pis)), obs_trajectory
+        # Value targets. Handle truncations > 0 due to terminal states. Treat last state as absorbing state.
+        t_valid = window < buffer.target_lengths[h_i][:, None]
+        t_indices = buffer.target_offsets[h_i][:, None] + np.minimum(window, (buffer.target_lengths[h_i] - 1)[:, None])
 
-    def sampleBatch(self, histories: typing.List[GameHistory]) -> typing.List:
+        pis = np.take(buffer.probabilities, t_indices, axis=0) * t_valid[..., None]  # Zero vector
+        vs = np.take(buffer.observed_returns, t_indices) * t_valid                    # = 0
+        rewards = np.take(buffer.rewards, t_indices) * t_valid                         # = 0
+
+        # (Actions, Targets)
+        return actions, (vs, rewards, pis)
+
+    def sampleBatch(self, histories: typing.List[GameHistory]) -> typing.Tuple:
         """
         Construct a batch of data-targets for gradient optimization of the MuZero neural network.
 
@@ -111,21 +152,55 @@ class MuZeroCoach(Coach):
         uniformly or with prioritized sampling. Using this list of coordinates, we sample the according games, and
         the according points of times within the game to generate neural network inputs, targets, and sample weights.
 
+        The given histories are flattened into a TrajectoryBuffer once and reused for as long as this method is
+        called with the same list object; i.e., during one backpropagation phase of the Coach. See getBuffer.
+
         :param histories: List of GameHistory objects. Contains all game-trajectories in the replay-buffer.
-        :return: List of training examples: (observations, actions, targets, forward_observations, sample_weights)
+        :return: Tuple of batched training data: (observations, actions, targets, forward_observations, sample_weights)
         """
+        buffer = self.getBuffer(histories)
+
         # Generate coordinates within the replay buffer to sample from. Also generate the loss scale of said samples.
         sample_coordinates, sample_weight = sample_batch(
             list_of_histories=histories, n=self.neural_net.net_args.batch_size, prioritize=self.args.prioritize,
             alpha=self.args.prioritize_alpha, beta=self.args.prioritize_beta)
+        h_i, t = np.asarray(sample_coordinates).T
 
         # Collect training examples for MuZero: (input, action, (targets), forward_observations, loss_scale)
-        examples = [(
-            histories[h_i].stackObservations(self.observation_stack_length, t=i),
-            *self.buildHypotheticalSteps(histories[h_i], t=i, k=self.args.K),
-            loss_scale
-        )
-            for (h_i, i), loss_scale in zip(sample_coordinates, sample_weight)
-        ]
-
-        return examples
+        observations = buffer.stackObservations(h_i, t, self.observation_stack_length)
+        actions, targets = self.buildHypotheticalSteps(buffer, h_i, t, k=self.args.K)
+
+        # If specified, also sample/ extrapolate future observations. Otherwise return an empty array.
+        forward_observations = np.zeros((len(h_i), 0), dtype=np.float32)
+        if self.return_forward_observations:
+            forward_observations = buffer.stackObservationsRange(h_i, t, self.args.K, self.observation_stack_length)
+
+        return observations, actions, targets, forward_observations, np.asarray(sample_weight)
+
+    def sampleBatches(self, histories: typing.List[GameHistory], n: int) -> typing.Iterator:
+        """
+        Yield 'n' batches of data for consecutive weight updates that are constructed asynchronously.
+
+        Batches are sampled by a tf.data pipeline that maps sampleBatch over 'n' indices with parallel calls and
+        prefetches the results. In this way, the sampling and formatting of observations and targets on the CPU
+        overlaps with the weight updates of the neural network.
+
+        :param histories: List of GameHistory objects. Contains all game-trajectories in the replay-buffer.
+        :param n: int Number of batches to sample.
+        :return: Iterator over the tuples of batched training data. @see sampleBatch
+        """
+        self.getBuffer(histories)  # Flatten the histories once before the pipeline calls sampleBatch concurrently.
+
+        def sample(_: np.ndarray) -> typing.List[np.ndarray]:
+            observations, actions, targets, forward_observations, sample_weight = self.sampleBatch(histories)
+            batch = (observations, actions, *targets, forward_observations, sample_weight)
+            return [x.astype(dtype.as_numpy_dtype) for x, dtype in zip(batch, dtypes)]
+
+        dtypes = [tf.float32, tf.int32] + [tf.float32] * 5  # Actions are integers, see buildHypotheticalSteps.
+        dataset = tf.data.Dataset.range(n).map(
+            lambda i: tf.numpy_function(sample, [i], dtypes),
+            num_parallel_calls=tf.data.experimental.AUTOTUNE
+        ).prefetch(tf.data.experimental.AUTOTUNE)
+
+        for observations, actions, vs, rs, pis, forward_observations, sample_weight in dataset.as_numpy_iterator():
+            yield observations, actions, (vs, rs, pis), forward_observations, sample_weight
@@ -19,6 +19,7 @@ Notes:
  -  Documentation 15/11/2020
 """
 import typing
+from collections import OrderedDict
 
 import numpy as np
 
@@ -60,10 +61,35 @@ class MuZeroMCTS:
         self.Ns = {}   # stores #times board s was visited
         self.Ps = {}   # stores initial policy (returned by neural net)
         self.Vs = {}   # stores valid moves at the ROOT node.
-
-    def clear_tree(self) -> None:
-        """ Clear all statistics stored in the current search tree """
-        self.Qsa, self.Ssa, self.Rsa, self.Nsa, self.Ns, self.Ps, self.Vs = [{} for _ in range(7)]
+        self.VLsa = {}  # stores virtual losses of s,a for pending batched searches
+
+        # LRU table of dynamics predictions keyed by (s_tensor, a), kept across searches within an episode.
+        # The table is cleared with clear_tree (episode boundaries) and once the network weights have been updated.
+        self.transpositions = OrderedDict()
+        self.transposition_size = self.args.get('transposition_table_size', 0)
+        self.transposition_steps = None  # Number of weight updates of the neural_net at which the table was filled.
+
+    def clear_tree(self, keep_transpositions: bool = False) -> None:
+        """ Clear all statistics stored in the current search tree (and by default the transposition table) """
+        self.Qsa, self.Ssa, self.Rsa, self.Nsa, self.Ns, self.Ps, self.Vs, self.VLsa = [{} for _ in range(8)]
+        if not keep_transpositions:
+            self.transpositions.clear()
+
+    def lookup_transposition(self, s: bytes, a: int) -> typing.Optional[typing.Tuple[float, np.ndarray,
+                                                                                     np.ndarray, float]]:
+        """ Get the memoized dynamics prediction (r, s_next, pi, v) for latent-state bytes s and action a if any. """
+        if (s, a) not in self.transpositions:
+            return None
+        self.transpositions.move_to_end((s, a))
+        return self.transpositions[(s, a)]
+
+    def store_transposition(self, s: bytes, a: int, prediction: typing.Tuple[float, np.ndarray,
+                                                                             np.ndarray, float]) -> None:
+        """ Memoize the dynamics prediction (r, s_next, pi, v) for latent-state bytes s and action a. """
+        if self.transposition_size > 0:
+            self.transpositions[(s, a)] = prediction
+            if len(self.transpositions) > self.transposition_size:
+                self.transpositions.popitem(last=False)  # Evict least recently used.
 
     def initialize_root(self, state: GameState, trajectory: GameHistory) -> typing.Tuple[typing.Tuple[bytes, tuple],
                                                                                          np.ndarray, float]:
@@ -106,6 +132,9 @@ class MuZeroMCTS:
         Illegal edges (only at the root state) are returned as zeros. The Q values within the tree are MinMax
         normalized over the accumulated statistics over the current tree search.
 
+        Edges on the path of pending batched searches carry a virtual loss: each virtual loss counts as an
+        additional visit with the lowest (normalized) value of zero. This steers concurrent selections apart.
+
         :param s: tuple Hashable key of the current-state inside the MCTS tree.
         :param a: int Action key representing the path to reach the child node from path (s, a)
         :param exploration_factor: float Pre-computed exploration factor from the MuZero PUCT formula.
@@ -116,6 +145,11 @@ class MuZeroMCTS:
 
         visit_count = self.Nsa[(s, a)] if (s, a) in self.Nsa else 0
         q_value = self.minmax.normalize(self.Qsa[(s, a)]) if (s, a) in self.Qsa else 0
+
+        if (s, a) in self.VLsa:
+            q_value = q_value * visit_count / (visit_count + self.VLsa[(s, a)])
+            visit_count += self.VLsa[(s, a)]
+
         c_children = np.max([self.Ns[s], 1e-8])  # Ensure that prior doesn't collapse to 0 if s is new.
 
         ucb = self.Ps[s][a] * np.sqrt(c_children) / (1 + visit_count) * exploration_factor  # Exploration
@@ -128,7 +162,8 @@ class MuZeroMCTS:
 
         Before the search we clear any statistics stored inside the tree (transitions, values, and MinMax bounds).
         In this way we ensure that simulation runtime stays relatively constant over multiple calls to this function
-        along with more predictable behaviour and numerical conditioning of the neural embeddings.
+        along with more predictable behaviour and numerical conditioning of the neural embeddings. The transposition
+        table of dynamics predictions is kept across the searches of an episode, unless the weights were updated.
 
         Our estimation of the root-value of the MCTS tree search is based on a sample average of each backed-up
         MCTS value. This means that this estimate represents an on-policy estimate V^pi.
@@ -140,15 +175,19 @@ class MuZeroMCTS:
         :param temp: float Visit count exponentiation factor. A value of 0 = Greedy, +infinity = uniformly random.
         :return: tuple (pi, v) The move probabilities of MCTS and the estimated root-value of the policy.
         """
-        # Refresh value bounds and statistics in the tree
+        # Refresh value bounds and statistics in the tree. Keep the transposition table unless the weights changed.
         self.minmax.refresh()
-        self.clear_tree()
+        self.clear_tree(keep_transpositions=(self.transposition_steps == self.neural_net.steps))
+        self.transposition_steps = self.neural_net.steps
 
         # Initialize the root variables needed for MCTS.
         s_0, latent_state, v_0 = self.initialize_root(state, trajectory)
 
         # Aggregate root state value over MCTS back-propagated values. On-policy.
-        v_search = sum([self._search(latent_state) for _ in range(self.args.num_MCTS_sims - 1)])
+        if self.args.get('mcts_batch_size', 1) > 1:
+            v_search = self._search_batched(latent_state, self.args.num_MCTS_sims - 1, self.args.mcts_batch_size)
+        else:
+            v_search = sum([self._search(latent_state) for _ in range(self.args.num_MCTS_sims - 1)])
         v = (v_0 + (v_search if self.single_player else -v_search)) / self.args.num_MCTS_sims
 
         # MCTS Visit count array for each edge 'a' from root node 's_0'.
@@ -195,8 +234,13 @@ class MuZeroMCTS:
         a = np.argmax(confidence_bounds).item()
 
         if (s_k, a) not in self.Ssa:  ### ROLLOUT
-            # Perform a forward pass in the dynamics function.
-            reward, next_latent, prior, value = self.neural_net.recurrent_inference(latent_state, a)
+            # Perform a forward pass in the dynamics function, unless the transition was already predicted.
+            prediction = self.lookup_transposition(s_k[0], a) if self.transposition_size > 0 else None
+            if prediction is None:
+                prediction = self.neural_net.recurrent_inference(latent_state, a)
+                self.store_transposition(s_k[0], a, prediction)
+
+            reward, next_latent, prior, value = prediction
             s_k_next = (next_latent.tobytes(), path + (a, ))              # Hashable representation.
 
             self.Rsa[(s_k, a)], self.Ssa[(s_k, a)] = reward, next_latent  # Current depth statistics
@@ -220,3 +264,103 @@ class MuZeroMCTS:
         self.Ns[s_k] += 1
 
         return gk if self.single_player else -gk
+
+    def _select(self, latent_state: np.ndarray) -> typing.Tuple[typing.List, np.ndarray, tuple]:
+        """
+        Iteratively traverse the tree from the given root latent-state with paths guided by the PUCT formula,
+        until an edge (s, a) is selected that has not yet been expanded.
+
+        :param latent_state: np.ndarray Numerical prediction of the root state by the encoder model.
+        :return: tuple (edges, latent_state, path) The traversed edges (s, a) from the root to the leaf edge,
+                 the latent-state of the leaf edge's parent, and the tree search-path of that parent.
+        """
+        edges, path = list(), tuple()
+        while True:
+            s_k = (latent_state.tobytes(), path)  # Hashable representation.
+
+            exploration_factor = self.args.c1 + np.log(self.Ns[s_k] + self.args.c2 + 1) - np.log(self.args.c2)
+            confidence_bounds = [self.compute_ucb(s_k, a, exploration_factor) for a in range(self.action_size)]
+            a = np.argmax(confidence_bounds).item()
+            edges.append((s_k, a))
+
+            if (s_k, a) not in self.Ssa:
+                return edges, latent_state, path
+
+            latent_state, path = self.Ssa[(s_k, a)], path + (a, )
+
+    def _search_batched(self, latent_state: np.ndarray, num_simulations: int, batch_size: int) -> float:
+        """
+        Perform 'num_simulations' searches from the given root latent-state, where the leaves of up to 'batch_size'
+        searches are expanded with one batched call to the dynamics model.
+
+        A batch is collected by repeatedly selecting a leaf edge with _select and placing a virtual loss on each
+        traversed edge, so that the next selection is steered towards a different leaf. If a leaf edge is selected
+        that is already pending, the batch is evaluated early. After the batched inference each leaf is expanded
+        and its value is backed up along its path as in _search; the virtual losses are then removed.
+
+        :param latent_state: np.ndarray Numerical prediction of the root state by the encoder model.
+        :param num_simulations: int Number of searches to perform.
+        :param batch_size: int Maximum number of leaves to expand with one neural network call.
+        :return: float The sum of the backed-up discounted/ Monte-Carlo returns of all searches.
+        """
+        v_search = 0
+        while num_simulations > 0:
+            # SELECTION. Collect leaves under virtual loss.
+            searches = list()
+            while len(searches) < min(batch_size, num_simulations):
+                edges, leaf_state, leaf_path = self._select(latent_state)
+                if any(edges[-1] == pending[-1] for pending, *_ in searches):
+                    break  # Leaf is already being expanded.
+
+                for edge in edges:
+                    self.VLsa[edge] = self.VLsa.get(edge, 0) + 1
+                searches.append((edges, leaf_state, leaf_path))
+
+            # ROLLOUT. Forward pass of all leaves that miss the transposition table in the dynamics function.
+            predictions = [None] * len(searches)
+            if self.transposition_size > 0:
+                predictions = [self.lookup_transposition(s_k[0], a) for (s_k, a) in (e[-1] for e, *_ in searches)]
+            misses = [i for i, prediction in enumerate(predictions) if prediction is None]
+            if misses:
+                latent_states = np.stack([searches[i][1] for i in misses])
+                actions = np.array([searches[i][0][-1][1] for i in misses])
+                r, s_next, pi, v = self.neural_net.recurrent_inference_batch(latent_states, actions)
+
+                for j, i in enumerate(misses):
+                    predictions[i] = (r[j].item(), s_next[j], pi[j], v[j].item())
+                    (s_k, a) = searches[i][0][-1]
+                    self.store_transposition(s_k[0], a, predictions[i])
+
+            for (edges, _, leaf_path), (reward, next_latent, prior, value) in zip(searches, predictions):
+                (s_k, a) = edges[-1]
+                s_k_next = (next_latent.tobytes(), leaf_path + (a, ))          # Hashable representation.
+
+                self.Rsa[(s_k, a)], self.Ssa[(s_k, a)] = reward, next_latent
+                self.Ps[s_k_next], self.Ns[s_k_next] = prior, 0
+
+                # BACKUP. Alternate value perspective for adversary.
+                value = value if self.single_player else -value
+                for edge in reversed(edges):
+                    self.VLsa[edge] -= 1
+                    if not self.VLsa[edge]:
+                        del self.VLsa[edge]
+
+                    gk = self.Rsa[edge] + self.args.gamma * value              # (Discounted) Value of the node
+
+                    if edge in self.Qsa:
+                        self.Qsa[edge] = (self.Nsa[edge] * self.Qsa[edge] + gk) / (self.Nsa[edge] + 1)
+                        self.Nsa[edge] += 1
+                    else:
+                        self.Qsa[edge] = gk
+                        self.Nsa[edge] = 1
+
+                    self.minmax.update(self.Qsa[edge])
+                    self.Ns[edge[0]] += 1
+
+                    value = gk if self.single_player else -gk
+
+                v_search += value
+
+            num_simulations -= len(searches)
+
+        return v_search
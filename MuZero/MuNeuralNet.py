@@ -12,6 +12,7 @@ from abc import ABC, abstractmethod
 
 import tensorflow as tf
 import numpy as np
+import h5py
 
 from utils import DotDict
 from utils.loss_utils import scalar_loss, scale_gradient, safe_l2norm
@@ -33,58 +34,158 @@ class MuZeroNeuralNet(ABC):
         :param game: Implementation of base Game class for environment logic.
         :param net_args: DotDict Data structure that contains all neural network arguments as object attributes.
         :param builder: Function that takes the game and network arguments as parameters and returns a tf.keras.Model
-        :raises: NotImplementedError if invalid optimization method is specified in the provided .json configuration.
+        :raises: NotImplementedError if invalid optimization method is specified in the provided .json configuration,
+                 or if mixed precision is requested on a tensorflow version without a global keras policy.
         """
         self.fit_rewards = (game.n_players == 1)
+        self.action_size = game.getActionSize()
         self.net_args = net_args
-        self.neural_net = builder(game, net_args)
         self.monitor = MuZeroMonitor(self)
         self.steps = 0
+        self.weight_decay = 0.0  # Decoupled weight decay that must be applied outside of the optimizer.
+        self._train_step = None
+        self._trainable_vars = None
+
+        # Optionally build the network with a mixed precision policy ('mixed_bfloat16' or 'mixed_float16').
+        # Variables, prediction heads, and latent states remain float32. The global policy is only set temporarily.
+        # The policy is only picked up by the keras layers from TF 2.4 onward (keras >= 2.4 wraps tf.keras).
+        self.mixed_precision = self.net_args.get('mixed_precision', None)
+        if self.mixed_precision:
+            if not hasattr(tf.keras.mixed_precision, 'set_global_policy'):
+                raise NotImplementedError(f"Mixed precision requires tensorflow >= 2.4, found {tf.__version__}...")
+
+            default_policy = tf.keras.mixed_precision.global_policy()
+            tf.keras.mixed_precision.set_global_policy(self.mixed_precision)
+            self.neural_net = builder(game, net_args)
+            tf.keras.mixed_precision.set_global_policy(default_policy)
+        else:
+            self.neural_net = builder(game, net_args)
 
         # Select parameter optimizer from config.
         if self.net_args.optimizer.method == "adam":
             self.optimizer = tf.optimizers.Adam(lr=self.net_args.optimizer.lr_init)
+        elif self.net_args.optimizer.method == "adamw":
+            weight_decay = self.net_args.optimizer.get('weight_decay', 0.004)
+            if hasattr(tf.keras.optimizers, 'AdamW'):
+                self.optimizer = tf.keras.optimizers.AdamW(learning_rate=self.net_args.optimizer.lr_init,
+                                                           weight_decay=weight_decay)
+            else:  # TF < 2.11 has no AdamW: decay the weights manually before each Adam update.
+                self.optimizer = tf.optimizers.Adam(lr=self.net_args.optimizer.lr_init)
+                self.weight_decay = weight_decay
         elif self.net_args.optimizer.method == "sgd":
             self.optimizer = tf.optimizers.SGD(lr=self.net_args.optimizer.lr_init,
                                                momentum=self.net_args.optimizer.momentum)
         else:
             raise NotImplementedError(f"Optimization method {self.net_args.optimizer.method} not implemented...")
 
+        # AdamW decays the weights by 'weight_decay' inside its update, the loss then omits the explicit l2 penalty.
+        self.decoupled_weight_decay = (self.net_args.optimizer.method == "adamw")
+
+        # Half precision gradients can underflow in float16, scale the loss dynamically to prevent this.
+        self.loss_scaling = (self.mixed_precision == 'mixed_float16')
+        if self.loss_scaling:
+            self.optimizer = tf.keras.mixed_precision.LossScaleOptimizer(self.optimizer)
+
+    def train_step(self, *data: tf.Tensor) -> typing.Tuple[tf.Tensor, typing.Tuple]:
+        """
+        Perform one optimization step on a batch of formatted data tensors inside one compiled computation graph.
+
+        The graph is traced once on the first call with an input_signature derived from the given tensors. All
+        training batches share the same shapes, so this prevents retracing across batches. If net_args.jit_compile
+        is set, the unrolling, loss computation, and optimizer update are compiled together with XLA.
+        Summaries must be logged outside of this function.
+
+        :param data: tf.Tensors ordered as the arguments of MuZeroNeuralNet.loss_function.
+        :return: tuple of a tf.Tensor and a tuple of tf.Tensors containing the total loss and stacked piecewise losses.
+        :see: MuZeroNeuralNet.loss_function
+        """
+        if self._train_step is None:
+            signature = [tf.TensorSpec.from_tensor(x) for x in data]
+            compile_args = dict()
+            if self.net_args.get('jit_compile', False):  # Keyword was named experimental_compile before TF 2.5.
+                tf_version = tuple(int(x) for x in tf.__version__.split('.')[:2])
+                compile_args['jit_compile' if tf_version >= (2, 5) else 'experimental_compile'] = True
+
+            self._train_step = tf.function(self._apply_gradients, input_signature=signature, **compile_args)
+        return self._train_step(*data)
+
+    def _apply_gradients(self, observations, actions, target_vs, target_rs, target_pis,
+                         target_observations, sample_weights) -> typing.Tuple[tf.Tensor, typing.Tuple]:
+        """ Compute the loss and its gradients w.r.t. all trainable variables and apply them with the optimizer. """
+        with tf.GradientTape() as tape:
+            loss, step_losses = self.loss_function(observations, actions, target_vs, target_rs, target_pis,
+                                                   target_observations, sample_weights)
+            scaled_loss = self.optimizer.get_scaled_loss(loss) if self.loss_scaling else loss
+
+        grads = tape.gradient(scaled_loss, self.get_variables())
+        if self.loss_scaling:
+            grads = self.optimizer.get_unscaled_gradients(grads)
+
+        if self.weight_decay > 0:  # Decoupled weight decay: w <- w - lr * weight_decay * w
+            for x in self.get_variables():
+                x.assign_sub(tf.cast(self.optimizer.learning_rate * self.weight_decay, x.dtype) * x)
+
+        self.optimizer.apply_gradients(zip(grads, self.get_variables()))
+
+        return loss, step_losses
+
     @tf.function
     def unroll(self, observations: tf.Tensor, actions: tf.Tensor) -> \
-            typing.List[typing.Tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]]:
+            typing.Tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]:
         """
         Build up a computation graph that collects output tensors from recurrently unrolling the MuZero model.
 
-        After each recurrent unrolling, the graph contains a layer that halves reverse differentiated gradients.
+        The recurrent steps are unrolled with a tf.while_loop that writes the predictions of each step into
+        tf.TensorArrays. This keeps the size of the graph constant in K. After each recurrent unrolling, the graph
+        contains a layer that halves reverse differentiated gradients.
 
         :param observations: tf.Tensor in R^(batch_size x width x height x (depth * time))
-        :param actions: tf.Tensor consisting of one-hot-encoded actions in {0, 1}^(batch_size x K x |action_space|)
-        :return: List of tuples containing the hidden state, value predictions and loss-scale for each unrolled step.
+        :param actions: tf.Tensor consisting of integer actions in {0, ..., |action_space| - 1}^(batch_size x K)
+        :return: Tuple of tensors stacked over the steps k = 0...K containing the loss-scale (K + 1), hidden states,
+                 value, reward (zeros for the root), and policy predictions (K + 1 x batch_size x ...).
         """
+        # A static K gives the TensorArrays a fixed size, which XLA requires (see train_step).
+        K = actions.shape[1] if actions.shape[1] is not None else tf.shape(actions)[1]
+        actions = tf.one_hot(actions, self.action_size, dtype=tf.float32)  # Encode actions on-device.
+
         # Root inference. Collect predictions of the form: [w_i / K, s, v, r, pi] for each forward step k = 0...K
         s, pi_0, v_0 = self.neural_net.forward(observations)
 
         # Note: Root can be a terminal state. Loss scale for the root head is 1.0 instead of 1 / K.
-        predictions = [(1.0, s, v_0, 0, pi_0)]
-        for k in range(actions.shape[1]):
-            r, s, pi, v = self.neural_net.recurrent([s, actions[:, k, :]])
-            predictions.append((1.0 / actions.shape[1], s, v, r, pi))
+        # The scale vector is built once outside of the loop: [1.0, 1 / K, ..., 1 / K]
+        scales = tf.concat([[1.0], tf.fill([K], 1.0 / tf.cast(K, tf.float32))], axis=0)
+
+        # The root inference does not predict rewards: its reward entry is a zero-tensor.
+        states = tf.TensorArray(s.dtype, size=K + 1, element_shape=s.shape).write(0, s)
+        vs = tf.TensorArray(v_0.dtype, size=K + 1, element_shape=v_0.shape).write(0, v_0)
+        rs = tf.TensorArray(v_0.dtype, size=K + 1, element_shape=v_0.shape).write(0, tf.zeros_like(v_0))
+        pis = tf.TensorArray(pi_0.dtype, size=K + 1, element_shape=pi_0.shape).write(0, pi_0)
+
+        def body(k, s_k, states_ta, vs_ta, rs_ta, pis_ta):
+            r, s_next, pi, v = self.neural_net.recurrent([s_k, actions[:, k, :]])
+
+            states_ta = states_ta.write(k + 1, s_next)
+            vs_ta, rs_ta, pis_ta = vs_ta.write(k + 1, v), rs_ta.write(k + 1, r), pis_ta.write(k + 1, pi)
 
             # Scale the gradient at the start of the dynamics function by 1/2
-            s = scale_gradient(s, 0.5)
+            return k + 1, scale_gradient(s_next, 0.5), states_ta, vs_ta, rs_ta, pis_ta
 
-        return predictions
+        _, _, states, vs, rs, pis = tf.while_loop(
+            lambda k, *_: k < K, body, loop_vars=(tf.constant(0), s, states, vs, rs, pis),
+            maximum_iterations=K, parallel_iterations=1, swap_memory=True)
+
+        return scales, states.stack(), vs.stack(), rs.stack(), pis.stack()
 
     @tf.function
     def loss_function(self, observations, actions, target_vs, target_rs, target_pis,
-                      target_observations, sample_weights) -> typing.Tuple[tf.Tensor, typing.List]:
+                      target_observations, sample_weights) -> typing.Tuple[tf.Tensor, typing.Tuple]:
         """
         Defines the computation graph for computing the loss of a MuZero model given data.
 
         The function recurrently unrolls the MuZero neural network based on data trajectories.
         From the collected output tensors, this function aggregates the loss for each prediction head for
-        each unrolled time step k = 0, 1, ..., K.
+        each unrolled time step k = 0, 1, ..., K. The loss of each head is computed for all steps at once over the
+        stacked (K + 1 x batch_size x ...) predictions of the unrolling.
 
         We expect target_pis/ MCTS probability vectors extrapolated beyond terminal states (i.e., no valid search
         statistics) to be a zero-vector. This is important as we infer the unrolling beyond terminal states by
@@ -99,68 +200,84 @@ class MuZeroNeuralNet(ABC):
         target_observations and the predicted latent state by the encoder network.
 
         :param observations: tf.Tensor in R^(batch_size x width x height x (depth * time)). Stacked state observations.
-        :param actions: tf.Tensor in {0, 1}^(batch_size x K x |action_space|). One-hot encoded actions for unrolling.
+        :param actions: tf.Tensor in {0, ..., |action_space| - 1}^(batch_size x K). Integer actions for unrolling.
         :param target_vs: tf.Tensor either in [0,1] or R with dimensions (K x batch_size x support_size)
         :param target_rs: tf.Tensor either in [0,1] or R with dimensions (K x batch_size x support_size)
         :param target_pis: tf.Tensor either in [0,1] or R with dimensions (K x batch_size x |action_space|)
         :param target_observations: tf.Tensor of same dimensions of observations for each unroll step in axis 1.
         :param sample_weights: tf.Tensor in [0, 1]^(batch_size). Of the form (batch_size * priority) ^ (-beta)
-        :return: tuple of a tf.Tensor and a list of tf.Tensors containing the total loss and piecewise losses.
+        :return: tuple of a tf.Tensor and a tuple of tf.Tensors containing the total loss and stacked piecewise losses.
         :see: MuNeuralNet.unroll
         """
-        loss_monitor = []  # Collect losses for logging.
+        # Root inference. Collect predictions of the form: [w_i / K, s, v, r, pi] for each forward step k = 0...K
+        loss_scales, states, vs, rs, pis = self.unroll(observations, actions)
 
-        # Sum over target probabilities. Absorbing states should have a zero sum --> leaf node.
-        absorb_k = 1.0 - tf.reduce_sum(target_pis, axis=-1)
+        # Calculate losses per head for all steps k = 0...K at once.
+        v_loss, r_loss, pi_loss, absorb_k = self.head_losses(vs, rs, pis, target_vs, target_rs, target_pis)
 
-        # Root inference. Collect predictions of the form: [w_i / K, s, v, r, pi] for each forward step k = 0...K
-        predictions = self.unroll(observations, actions)
+        step_loss = scale_gradient(r_loss + v_loss + pi_loss, loss_scales[:, None] * sample_weights[None, :])
+        total_loss = tf.reduce_sum(step_loss)  # Actually averages over batch : see sample_weights.
 
-        # Perform loss computation for each unrolling step.
-        total_loss = tf.constant(0.0, dtype=tf.float32)
-        for k in range(len(predictions)):  # Length = 1 + K (root + hypothetical forward steps)
-            loss_scale, states, vs, rs, pis = predictions[k]
-            t_vs, t_rs, t_pis = target_vs[k, ...], target_rs[k, ...], target_pis[k, ...]
-            absorb = absorb_k[k, :]
+        # If specified, slightly regularize the dynamics model using the discrepancy between the abstract state
+        # predicted by the dynamics model with the encoder. This penalty should be low to emphasize
+        # value prediction, but may aid stability of learning.
+        if self.net_args.dynamics_penalty > 0:
+            # Infer latent states as predicted by the encoder and cancel the gradients for the encoder
+            forward_observations = tf.transpose(target_observations, [1, 0, *range(2, len(target_observations.shape))])
+            encoded_states = self.neural_net.encoder(tf.reshape(forward_observations, [-1, *observations.shape[1:]]))
+            encoded_states = tf.stop_gradient(tf.reshape(encoded_states, tf.shape(states[1:])))
 
-            # Calculate losses per head. Cancel gradients in prior for absorbing states, keep gradients for r and v.
-            r_loss = scalar_loss(rs, t_rs) if (k > 0 and self.fit_rewards) else tf.constant(0, dtype=tf.float32)
-            v_loss = scalar_loss(vs, t_vs)
-            pi_loss = scalar_loss(pis, t_pis) * (1.0 - absorb)
+            contrastive_loss = tf.reduce_mean(tf.square(states[1:] - encoded_states),
+                                              axis=list(range(2, len(states.shape))))
+            contrastive_loss = scale_gradient(contrastive_loss, loss_scales[1:, None] * sample_weights[None, :])
 
-            step_loss = scale_gradient(r_loss + v_loss + pi_loss, loss_scale * sample_weights)
-            total_loss += tf.reduce_sum(step_loss)  # Actually averages over batch : see sample_weights.
+            total_loss += self.net_args.dynamics_penalty * tf.reduce_sum(contrastive_loss)
 
-            # If specified, slightly regularize the dynamics model using the discrepancy between the abstract state
-            # predicted by the dynamics model with the encoder. This penalty should be low to emphasize
-            # value prediction, but may aid stability of learning.
-            if self.net_args.dynamics_penalty > 0 and k > 0:
-                # Infer latent states as predicted by the encoder and cancel the gradients for the encoder
-                encoded_states = self.neural_net.encoder(target_observations[:, (k - 1), ...])
-                encoded_states = tf.stop_gradient(encoded_states)
+        # Penalize magnitude of weights using l2 norm (unless the optimizer applies weight decay)
+        if not self.decoupled_weight_decay:
+            l2_norm = tf.add_n([safe_l2norm(x) for x in self.get_variables()])
+            total_loss += self.net_args.l2 * l2_norm
 
-                contrastive_loss = tf.reduce_mean(tf.keras.losses.mean_squared_error(states, encoded_states),
-                                                  axis=-1)
-                contrastive_loss = scale_gradient(contrastive_loss, loss_scale * sample_weights)
+        # Logging. Piecewise losses stay stacked as (K + 1 x batch_size) tensors.
+        loss_monitor = (v_loss, r_loss, pi_loss, absorb_k)
 
-                total_loss += self.net_args.dynamics_penalty * tf.reduce_sum(contrastive_loss)
+        return total_loss, loss_monitor
 
-            # Logging
-            loss_monitor.append((v_loss, r_loss, pi_loss, absorb))
+    def head_losses(self, vs: tf.Tensor, rs: tf.Tensor, pis: tf.Tensor, target_vs: tf.Tensor, target_rs: tf.Tensor,
+                    target_pis: tf.Tensor) -> typing.Tuple[tf.Tensor, tf.Tensor, tf.Tensor, tf.Tensor]:
+        """
+        Compute the value, reward, and policy losses of all unrolled steps with one scalar_loss call per head.
+
+        Gradients in the prior are cancelled for absorbing states, gradients for r and v are kept. The root (k = 0)
+        does not predict a reward, so its reward loss is zero and only computed for k = 1...K.
+
+        :param vs: tf.Tensor Stacked value predictions of dimensions (K + 1 x batch_size x support_size)
+        :param rs: tf.Tensor Stacked reward predictions of dimensions (K + 1 x batch_size x support_size)
+        :param pis: tf.Tensor Stacked policy predictions of dimensions (K + 1 x batch_size x |action_space|)
+        :param target_vs: tf.Tensor Value targets of the same dimensions as vs.
+        :param target_rs: tf.Tensor Reward targets of the same dimensions as rs.
+        :param target_pis: tf.Tensor MCTS probability targets of the same dimensions as pis.
+        :return: Tuple of (K + 1 x batch_size) tensors: value, reward, and policy losses, and the absorbing states.
+        """
+        # Sum over target probabilities. Absorbing states should have a zero sum --> leaf node.
+        absorb_k = 1.0 - tf.reduce_sum(target_pis, axis=-1)
 
-        # Penalize magnitude of weights using l2 norm
-        l2_norm = tf.reduce_sum([safe_l2norm(x) for x in self.get_variables()])
-        total_loss += self.net_args.l2 * l2_norm
+        v_loss = scalar_loss(vs, target_vs)
+        pi_loss = scalar_loss(pis, target_pis) * (1.0 - absorb_k)
+        r_loss = tf.zeros_like(v_loss)
+        if self.fit_rewards:
+            # The zero root reward is no distribution (0/0 in the cross-entropy), so it is excluded from the loss.
+            r_loss = tf.concat([r_loss[:1], scalar_loss(rs[1:], target_rs[1:])], axis=0)
 
-        return total_loss, loss_monitor
+        return v_loss, r_loss, pi_loss, absorb_k
 
     @abstractmethod
-    def train(self, examples: typing.List) -> None:
+    def train(self, examples: typing.Tuple) -> None:
         """
         This function trains the neural network with data gathered from self-play.
 
-        :param examples: a list of training examples of the form:
-                         (observation_trajectories, action_trajectories, targets, loss_scales).
+        :param examples: a tuple of batched training data of the form:
+                         (observation_trajectories, action_trajectories, targets, forward_observations, loss_scales).
         """
 
     @abstractmethod
@@ -200,56 +317,76 @@ class MuZeroNeuralNet(ABC):
             v: a float that gives the state value estimate of the provided state.
         """
 
+    @abstractmethod
+    def initial_inference_batch(self, observations: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched equivalent of initial_inference for a batch of (stacked) observations.
+
+        :param observations: Batch of game specific (stacked) tensors of observations: batch_size x o_t.
+        :return: A tuple with batched predictions of the form (s_(0), pi, v), see initial_inference.
+        """
+
+    @abstractmethod
+    def recurrent_inference_batch(self, latent_states: np.ndarray, actions: np.ndarray) -> \
+            typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched equivalent of recurrent_inference for a batch of latent states and integer actions.
+
+        :param latent_states: Batch of neural encodings of the environment: batch_size x s_k.
+        :param actions: np.ndarray of batch_size integer actions to perform on the latent states.
+        :return: A tuple with batched predictions of the form (r, s_(k+1), pi, v), see recurrent_inference.
+        """
+
+    def _checkpoint_models(self) -> typing.Dict[str, typing.Any]:
+        """ Get all keras Models whose weights are stored in a checkpoint, keyed by their group name in the file. """
+        models = {
+            'representation': self.neural_net.encoder,
+            'dynamics': self.neural_net.dynamics,
+            'predictor': self.neural_net.predictor
+        }
+        if hasattr(self.neural_net, 'decoder'):
+            models['decoder'] = self.neural_net.decoder
+        return models
+
     def save_checkpoint(self, folder: str = 'checkpoint', filename: str = 'checkpoint.pth.tar') -> None:
         """
         Saves the current neural network (with its parameters) in folder/filename
-        Each individual part of the MuZero algorithm is stored separately (representation, dynamics, prediction
-        and optionally the latent state decoder).
+        All individual parts of the MuZero algorithm (representation, dynamics, prediction and optionally the
+        latent state decoder) are stored as separate groups within one HDF5 file, so that the file is only
+        opened and flushed once.
 
         If specified folder does not yet exists, the method creates a new folder if permitted.
 
-        :param folder: str Path to model weight files
-        :param filename: str Base name for model weight files
+        :param folder: str Path to model weight file
+        :param filename: str Base name for model weight file
         """
-        representation_path = os.path.join(folder, 'r_' + filename)
-        dynamics_path = os.path.join(folder, 'd_' + filename)
-        predictor_path = os.path.join(folder, 'p_' + filename)
+        filepath = os.path.join(folder, filename)
         if not os.path.exists(folder):
             print(f"Checkpoint Directory does not exist! Making directory {folder}")
             os.mkdir(folder)
         else:
             print("Checkpoint Directory exists! ")
-        self.neural_net.encoder.save_weights(representation_path)
-        self.neural_net.dynamics.save_weights(dynamics_path)
-        self.neural_net.predictor.save_weights(predictor_path)
 
-        if hasattr(self.neural_net, 'decoder'):
-            decoder_path = os.path.join(folder, 'decoder_' + filename)
-            self.neural_net.decoder.save_weights(decoder_path)
+        with h5py.File(filepath, 'w') as f:
+            for name, model in self._checkpoint_models().items():
+                group = f.create_group(name)
+                for i, weights in enumerate(model.get_weights()):
+                    group.create_dataset(str(i), data=weights)
 
     def load_checkpoint(self, folder: str = 'checkpoint', filename: str = 'checkpoint.pth.tar') -> None:
         """
         Loads parameters of each neural network model from given folder/filename
 
-        :param folder: str Path to model weight files
-        :param filename: str Base name of model weight files
-        :raises: FileNotFoundError if one of the three implementations are missing or if path is incorrectly specified.
+        :param folder: str Path to model weight file
+        :param filename: str Base name of model weight file
+        :raises: FileNotFoundError if the path is incorrectly specified or if one of the models is missing in the file.
         """
-        representation_path = os.path.join(folder, 'r_' + filename)
-        dynamics_path = os.path.join(folder, 'd_' + filename)
-        predictor_path = os.path.join(folder, 'p_' + filename)
-
-        if not os.path.exists(representation_path):
-            raise FileNotFoundError(f"No MuZero Representation Model in path {representation_path}")
-        if not os.path.exists(dynamics_path):
-            raise FileNotFoundError(f"No MuZero Dynamics Model in path {dynamics_path}")
-        if not os.path.exists(predictor_path):
-            raise FileNotFoundError(f"No MuZero Predictor Model in path {predictor_path}")
-
-        self.neural_net.encoder.load_weights(representation_path)
-        self.neural_net.dynamics.load_weights(dynamics_path)
-        self.neural_net.predictor.load_weights(predictor_path)
-
-        if hasattr(self.neural_net, 'decoder'):
-            decoder_path = os.path.join(folder, 'decoder_' + filename)
-            self.neural_net.decoder.load_weights(decoder_path)
+        filepath = os.path.join(folder, filename)
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"No MuZero Model in path {filepath}")
+
+        with h5py.File(filepath, 'r') as f:
+            for name, model in self._checkpoint_models().items():
+                if name not in f:
+                    raise FileNotFoundError(f"No MuZero {name.capitalize()} Model in checkpoint {filepath}")
+                model.set_weights([f[name][str(i)][()] for i in range(len(f[name]))])
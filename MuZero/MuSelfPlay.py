@@ -0,0 +1,182 @@
+"""
+Defines the logic for playing multiple MuZero self-play episodes concurrently in separate worker processes.
+
+Each worker process runs its own games and MCTS, but does not perform neural network inference itself. Instead,
+workers send their inference queries to the main process that holds the MuZero model. The main process collects
+the pending queries of all workers into one batch and answers them with a single batched call to the network.
+
+Notes:
+ -  Worker processes are forked from the main process. This is only supported on POSIX systems, and the workers
+    must not use tensorflow themselves.
+ -  Forking while other threads of the main process hold locks (e.g., the tf.data pipeline of the backpropagation)
+    can deadlock the workers. MuZeroCoach therefore rejects 'concurrent_selfplay' together with multiple workers.
+"""
+import multiprocessing as mp
+import queue
+import typing
+
+import numpy as np
+
+from utils import DotDict
+from utils.selfplay_utils import GameHistory
+
+INITIAL, RECURRENT = 0, 1  # Types of inference queries.
+
+
+class InferenceClient:
+    """
+    Stand-in for a MuZeroNeuralNet inside a self-play worker process. Inference calls are forwarded to the
+    InferenceServer in the main process, other attributes needed by MCTS are copied from the actual network.
+    """
+
+    def __init__(self, worker_id: int, net_args: DotDict, steps: int, requests: mp.Queue, responses: mp.Queue) -> None:
+        """
+        :param worker_id: int Index of the worker process that uses this client.
+        :param net_args: DotDict Neural network arguments of the MuZeroNeuralNet that answers the queries.
+        :param steps: int Number of weight updates of the MuZeroNeuralNet that answers the queries.
+        :param requests: mp.Queue Shared queue to send inference queries to the InferenceServer.
+        :param responses: mp.Queue Queue of this worker to receive the inference results on.
+        """
+        self.worker_id = worker_id
+        self.net_args = net_args
+        self.steps = steps
+        self.requests = requests
+        self.responses = responses
+
+    def initial_inference(self, observations: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, float]:
+        """ Query MuZeroNeuralNet.initial_inference in the main process. """
+        self.requests.put((self.worker_id, INITIAL, observations))
+        return self.responses.get()
+
+    def recurrent_inference(self, latent_state: np.ndarray, action: int) -> typing.Tuple[float, np.ndarray,
+                                                                                         np.ndarray, float]:
+        """ Query MuZeroNeuralNet.recurrent_inference in the main process. """
+        r, s_next, pi, v = self.recurrent_inference_batch(latent_state[np.newaxis, ...], np.array([action]))
+        return r[0].item(), s_next[0], pi[0], v[0].item()
+
+    def recurrent_inference_batch(self, latent_states: np.ndarray, actions: np.ndarray) -> \
+            typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Query MuZeroNeuralNet.recurrent_inference_batch in the main process. """
+        self.requests.put((self.worker_id, RECURRENT, (latent_states, actions)))
+        return self.responses.get()
+
+
+class InferenceServer:
+    """
+    Answers the inference queries of the InferenceClients with batched calls to the MuZeroNeuralNet.
+    """
+
+    def __init__(self, neural_net, num_workers: int, max_wait: float = 1e-3) -> None:
+        """
+        :param neural_net: MuNeuralNet Implementation of MuNeuralNet class for inference.
+        :param num_workers: int Number of worker processes that send queries.
+        :param max_wait: float Seconds to wait for queries of other workers before answering an incomplete batch.
+        """
+        self.neural_net = neural_net
+        self.num_workers = num_workers
+        self.max_wait = max_wait
+
+        ctx = mp.get_context('fork')
+        self.requests = ctx.Queue()
+        self.responses = [ctx.Queue() for _ in range(num_workers)]
+
+    def client(self, worker_id: int) -> InferenceClient:
+        """ Create the InferenceClient for the given worker. """
+        return InferenceClient(worker_id, self.neural_net.net_args, self.neural_net.steps,
+                               self.requests, self.responses[worker_id])
+
+    def serve(self, num_active: int, timeout: float) -> None:
+        """
+        Collect one batch of queries and answer them. Every worker has at most one pending query, so a batch
+        is complete once all 'num_active' workers have sent a query or when no query arrives within 'max_wait'.
+
+        :param num_active: int Number of workers that are still playing episodes.
+        :param timeout: float Seconds to wait for the first query of the batch.
+        """
+        try:
+            batch = [self.requests.get(timeout=timeout)]
+        except queue.Empty:
+            return
+
+        while len(batch) < num_active:
+            try:
+                batch.append(self.requests.get(timeout=self.max_wait))
+            except queue.Empty:
+                break
+
+        initial = [(worker_id, query) for worker_id, kind, query in batch if kind == INITIAL]
+        recurrent = [(worker_id, query) for worker_id, kind, query in batch if kind == RECURRENT]
+
+        if initial:
+            worker_ids, observations = zip(*initial)
+            s_0, pi, v = self.neural_net.initial_inference_batch(np.stack(observations))
+            for i, worker_id in enumerate(worker_ids):
+                self.responses[worker_id].put((s_0[i], pi[i], v[i].item()))
+
+        if recurrent:
+            # Recurrent queries contain a batch of leaves per worker (see MuZeroMCTS._search_batched).
+            worker_ids, queries = zip(*recurrent)
+            latent_states, actions = zip(*queries)
+            predictions = self.neural_net.recurrent_inference_batch(np.concatenate(latent_states),
+                                                                    np.concatenate(actions))
+
+            splits = np.cumsum([len(a) for a in actions])[:-1]
+            for i, worker_prediction in enumerate(zip(*[np.split(x, splits) for x in predictions])):
+                self.responses[worker_ids[i]].put(worker_prediction)
+
+
+def execute_episodes_parallel(coach, n: int, num_workers: int) -> typing.Iterator[GameHistory]:
+    """
+    Play 'n' self-play episodes with the given Coach distributed over 'num_workers' forked worker processes.
+
+    Each worker replaces the search engine of its (forked) copy of the Coach with one that queries the
+    InferenceServer, and plays its share of the episodes with Coach.executeEpisode. The main process answers
+    the inference queries until all episodes are finished.
+
+    :param coach: MuZeroCoach Coach whose search engine class, game, and arguments are used for self-play.
+    :param n: int Number of episodes to play.
+    :param num_workers: int Number of worker processes.
+    :return: Iterator over the GameHistory objects of each finished episode, in order of completion.
+    :raises RuntimeError: If a worker process exits unexpectedly.
+    """
+    ctx = mp.get_context('fork')
+    server = InferenceServer(coach.neural_net, num_workers)
+    results = ctx.Queue()
+
+    def work(worker_id: int, num_episodes: int, seed: int) -> None:
+        np.random.seed(seed)  # Forked workers otherwise share the random state of the main process.
+        coach.mcts = coach.mcts.__class__(coach.game, server.client(worker_id), coach.args)
+        for _ in range(num_episodes):
+            coach.mcts.clear_tree()
+            results.put((worker_id, coach.executeEpisode()))
+        results.put((worker_id, None))
+
+    shares = [len(x) for x in np.array_split(np.arange(n), num_workers)]
+    seeds = np.random.randint(2 ** 31, size=num_workers)
+    workers = [ctx.Process(target=work, args=(i, shares[i], seeds[i]), daemon=True) for i in range(num_workers)]
+    for w in workers:
+        w.start()
+
+    active = set(range(num_workers))
+    try:
+        while active:
+            server.serve(len(active), timeout=server.max_wait)
+
+            while True:
+                try:
+                    worker_id, history = results.get_nowait()
+                except queue.Empty:
+                    break
+
+                if history is None:
+                    active.discard(worker_id)
+                else:
+                    yield history
+
+            if any(w.exitcode not in (None, 0) for w in workers):
+                raise RuntimeError("A self-play worker process exited unexpectedly.")
+    finally:
+        for w in workers:
+            w.join(timeout=1.0)
+            if w.is_alive():
+                w.terminate()
@@ -8,12 +8,12 @@ Notes:
  -  Documentation 16/11/2020
 """
 import numpy as np
+import tensorflow as tf
 import sys
 import typing
 
-from tensorflow import GradientTape
-
 from utils.loss_utils import support_to_scalar, scalar_to_support, cast_to_tensor
+from utils.network_utils import QuantizedModel
 from MuZero.MuNeuralNet import MuZeroNeuralNet
 import Agents
 
@@ -37,69 +37,104 @@ class DefaultMuZero(MuZeroNeuralNet):
         :param architecture: str Neural network architecture to build in the super class.
         """
         super().__init__(game, net_args, Agents.MuZeroNetworks[architecture])
-        self.action_size = game.getActionSize()
         self.architecture = architecture
 
+        # Optionally perform recurrent inference (MCTS) with an int8 quantized copy of the recurrent model.
+        # The copy is cached per weight version: it is rebuilt once 'quantize_interval' weight updates have passed.
+        self.quantize_inference = (self.net_args.get('inference_precision', None) == 'int8')
+        self.quantize_interval = self.net_args.get('quantize_interval', 1)
+        self._quantized_recurrent = None
+        self._quantized_steps = 0
+        self._representative_batch = None
+        self.calibration_net = self  # DefaultMuZero whose last training batch calibrates the int8 activations.
+
+        if self.quantize_inference and not QuantizedModel.supports(self.neural_net.recurrent):
+            raise NotImplementedError("int8 inference requires a tf.keras network and tensorflow >= 2.5...")
+
     def get_variables(self) -> typing.List:
-        """ Get all trainable parameters defined by the neural network """
-        parts = (self.neural_net.encoder, self.neural_net.predictor, self.neural_net.dynamics)
-        return [v for v_list in map(lambda n: n.weights, parts) for v in v_list]
+        """ Get all trainable parameters defined by the neural network (cached after first call) """
+        if self._trainable_vars is None:
+            parts = (self.neural_net.encoder, self.neural_net.predictor, self.neural_net.dynamics)
+            self._trainable_vars = [v for v_list in map(lambda n: n.trainable_variables, parts) for v in v_list]
+        return self._trainable_vars
 
-    def train(self, examples: typing.List) -> float:
+    def train(self, examples: typing.Tuple) -> float:
         """
         This function trains the neural network with data gathered from self-play.
 
-        The examples data list is unpacked and formatted to the correct dimensions for the MuZero unrolling/
+        The examples data tuple is unpacked and formatted to the correct dimensions for the MuZero unrolling/
         loss computation. The resulting, formatted, data (np.ndarray) are cast to tf.Tensors before being
-        passed to the MuNeuralNet loss_function class. This loss function call is done inside a tf.GradientTape
+        passed to the compiled MuNeuralNet train_step. This computes the loss inside a tf.GradientTape
         to observe the gradients of all defined variables within the tf.graph. Based on the recorded gradient
         we perform one weight update using the optimizer defined in the super class. Returned loss values are
         additionally sent to the Monitor class for logging.
 
-        :param examples: a list of training examples of length batch_size and the form:
-                         (observation_trajectories, action_trajectories, targets, loss_scales).
+        :param examples: a tuple of batched training data of the form:
+                         (observation_trajectories, action_trajectories, targets, forward_observations, loss_scales).
                          Dimensions should be of the form:
                          observations: batch_size x width x height x (depth * time)
-                         actions: batch_size x k x |action-space|
+                         actions: batch_size x k (integer actions)
                          forward_observations: batch_size x k x width x height x (depth * time)
                          target_vs, target_rs: batch_size x k
                          target_pi: batch_size x k x |action-space|
                          sample_weight: batch_size x 1
         """
         # Unpack and transform data for loss computation.
-        observations, actions, targets, forward_observations, sample_weight = list(zip(*examples))
-
-        forward_observations = np.asarray(forward_observations)
-
-        actions, sample_weight = np.asarray(actions), np.asarray(sample_weight)
+        observations, actions, targets, forward_observations, sample_weight = examples
+        self._representative_batch = (observations, actions)
 
         # Unpack and encode targets. Value target shapes are of the form [time, batch_size, categories]
-        target_vs, target_rs, target_pis = list(map(np.asarray, zip(*targets)))
+        target_vs, target_rs, target_pis = targets
 
-        target_vs = np.asarray([scalar_to_support(target_vs[:, t], self.net_args.support_size)
-                                for t in range(target_vs.shape[-1])])
-        target_rs = np.asarray([scalar_to_support(target_rs[:, t], self.net_args.support_size)
-                                for t in range(target_rs.shape[-1])])
+        target_vs = scalar_to_support(target_vs.T, self.net_args.support_size)
+        target_rs = scalar_to_support(target_rs.T, self.net_args.support_size)
         target_pis = np.swapaxes(target_pis, 0, 1)
 
         # Pack formatted inputs as tensors.
-        data = [cast_to_tensor(x) for x in [observations, actions, target_vs, target_rs,
+        data = [cast_to_tensor(x) for x in [observations, target_vs, target_rs,
                                             target_pis, forward_observations, sample_weight]]
+        data.insert(1, tf.convert_to_tensor(actions, dtype=tf.int32))
 
-        # Track the gradient through unrolling and loss computation and perform an optimization step.
-        with GradientTape() as tape:
-            loss, step_losses = self.loss_function(*data)
-
-        grads = tape.gradient(loss, self.get_variables())
-        self.optimizer.apply_gradients(zip(grads, self.get_variables()), name=f'MuZeroDefault_{self.architecture}')
+        # Track the gradient through unrolling and loss computation and perform an optimization step in-graph.
+        loss, step_losses = self.train_step(*data)
 
-        # Logging
-        self.monitor.log(loss / len(examples), "total loss")
-        for k, step_loss in enumerate(step_losses):
-            self.monitor.log_recurrent_losses(k, *step_loss)
+        # Logging. Summaries are written outside of the compiled train_step and only every LOG_RATE steps.
+        if self.monitor.should_log():
+            self.monitor.log(loss / len(sample_weight), "total loss")
+            self.monitor.log_recurrent_losses(*step_losses)
 
         self.steps += 1
 
+    def load_checkpoint(self, folder: str = 'checkpoint', filename: str = 'checkpoint.pth.tar') -> None:
+        """ Loads parameters of each neural network model and discards the quantized recurrent model if any. """
+        super().load_checkpoint(folder, filename)
+        self._quantized_recurrent = None
+
+    def get_recurrent_model(self):
+        """
+        Get the model to perform recurrent inference with. If 'inference_precision' is set to 'int8', this is an
+        int8 quantized copy of the recurrent model that is (re-)built lazily once the weights have been updated
+        'quantize_interval' times since the last quantization, or after loading a checkpoint. Activations are
+        calibrated on root latent-states of the last training batch of 'calibration_net' (this network by default);
+        without a training batch (e.g., after loading a checkpoint for a tourney) only the weights are quantized.
+
+        :return: Keras Model or QuantizedModel with a predict_on_batch method.
+        """
+        if not self.quantize_inference:
+            return self.neural_net.recurrent
+
+        if self._quantized_recurrent is None or self.steps - self._quantized_steps >= self.quantize_interval:
+            representative_data = None
+            if self.calibration_net._representative_batch is not None:
+                observations, actions = self.calibration_net._representative_batch
+                latent_states = self.neural_net.encoder.predict_on_batch(observations)
+                representative_data = [np.asarray(latent_states), np.eye(self.action_size)[actions[:, 0]]]
+
+            self._quantized_recurrent = QuantizedModel(self.neural_net.recurrent, representative_data)
+            self._quantized_steps = self.steps
+
+        return self._quantized_recurrent
+
     def initial_inference(self, observations: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, float]:
         """
         Combines the prediction and representation implementations into one call. This reduces
@@ -115,14 +150,24 @@ class DefaultMuZero(MuZeroNeuralNet):
             v: a float that gives the state value estimate of the provided state.
         """
         # Pad batch dimension
-        observations = observations[np.newaxis, ...]
+        s_0, pi, v = self.initial_inference_batch(observations[np.newaxis, ...])
+
+        return s_0[0], pi[0], v[0].item()
 
-        s_0, pi, v = self.neural_net.forward.predict(observations)
+    def initial_inference_batch(self, observations: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched equivalent of initial_inference. The inferred state values are cast from their distributional bins
+        into scalars.
+
+        :param observations: Batch of (stacked) observation tensors of the environment: batch_size x o_t.
+        :return: A tuple with batched predictions of the form (s_(0), pi, v), see initial_inference.
+        """
+        s_0, pi, v = self.neural_net.forward.predict_on_batch(observations)
 
         # Cast bins to scalar
-        v_real = support_to_scalar(v, self.net_args.support_size)
+        v_real = support_to_scalar(np.asarray(v), self.net_args.support_size)
 
-        return s_0[0], pi[0], np.ndarray.item(v_real)
+        return np.asarray(s_0), np.asarray(pi), np.reshape(v_real, -1)
 
     def recurrent_inference(self, latent_state: np.ndarray, action: int) -> typing.Tuple[float, np.ndarray,
                                                                                          np.ndarray, float]:
@@ -141,18 +186,28 @@ class DefaultMuZero(MuZeroNeuralNet):
             pi: a policy vector for the provided state - a numpy array of length |action_space|.
             v: a float that gives the state value estimate of the provided state.
         """
-        # One hot encode integer actions.
-        a_plane = np.zeros(self.action_size)
-        a_plane[action] = 1
-
         # Pad batch dimension
-        latent_state = latent_state[np.newaxis, ...]
-        a_plane = a_plane[np.newaxis, ...]
+        r, s_next, pi, v = self.recurrent_inference_batch(latent_state[np.newaxis, ...], np.array([action]))
+
+        return r[0].item(), s_next[0], pi[0], v[0].item()
+
+    def recurrent_inference_batch(self, latent_states: np.ndarray, actions: np.ndarray) -> \
+            typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched equivalent of recurrent_inference. Integer actions are encoded to one-hot-encoded vectors.
+        Inferred reward and state values are cast from their distributional bins into scalars.
+
+        :param latent_states: Batch of neural encodings of the environment: batch_size x s_k.
+        :param actions: np.ndarray of batch_size integer actions to perform on the latent states.
+        :return: A tuple with batched predictions of the form (r, s_(k+1), pi, v), see recurrent_inference.
+        """
+        # One hot encode integer actions.
+        a_planes = np.eye(self.action_size)[actions]
 
-        r, s_next, pi, v = self.neural_net.recurrent.predict([latent_state, a_plane])
+        r, s_next, pi, v = self.get_recurrent_model().predict_on_batch([latent_states, a_planes])
 
         # Cast bins to scalar
-        v_real = support_to_scalar(v, self.net_args.support_size)
-        r_real = support_to_scalar(r, self.net_args.support_size)
+        v_real = support_to_scalar(np.asarray(v), self.net_args.support_size)
+        r_real = support_to_scalar(np.asarray(r), self.net_args.support_size)
 
-        return np.ndarray.item(r_real), s_next[0], pi[0], np.ndarray.item(v_real)
+        return np.reshape(r_real, -1), np.asarray(s_next), np.asarray(pi), np.reshape(v_real, -1)
@@ -0,0 +1,34 @@
+"""
+Shared fixtures for the tests of the MuZero implementation.
+
+Run from the repository root: python -m unittest discover -s Testing
+"""
+import os
+import unittest
+
+import numpy as np
+
+import Agents  # Resolves the circular import of DefaultMuZero through the Agents package.
+from Games.gym.GymGame import GymGame
+from MuZero.implementations.DefaultMuZero import DefaultMuZero
+
+from utils import DotDict
+
+CONFIGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Configurations', 'ModelConfigs')
+
+
+class GymMuZeroTestCase(unittest.TestCase):
+    """
+    Base TestCase that builds a DefaultMuZero network for the Gym (CartPole) game on a fixed seed. The configuration
+    is loaded from Configurations/ModelConfigs/MuzeroCartpole.json for every test, so tests may modify it.
+    """
+
+    def setUp(self) -> None:
+        np.random.seed(0)
+        self.config = DotDict.from_json(os.path.join(CONFIGS, 'MuzeroCartpole.json'))
+        self.g = GymGame('CartPole-v1')
+        self.net = self.build_network()
+
+    def build_network(self) -> DefaultMuZero:
+        """ Build a new DefaultMuZero with the Gym architecture from the (possibly modified) test configuration. """
+        return DefaultMuZero(self.g, self.config.net_args, 'Gym')
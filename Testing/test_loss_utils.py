@@ -0,0 +1,50 @@
+"""
+Python code to test the N-D distributional support transformations against their 1-D row-wise application.
+
+Run from the repository root: python -m unittest discover -s Testing
+"""
+import unittest
+
+import numpy as np
+
+from utils.loss_utils import scalar_to_support, support_to_scalar
+
+
+class TestSupportTransformation(unittest.TestCase):
+
+    def test_scalar_to_support_nd(self):
+        """
+        Tests that scalar_to_support on an N-D array equals casting each 1-D row separately:
+         - Assert equal bins for 1-D, 2-D (time x batch_size), and 3-D inputs on a fixed seed
+         - Assert that each set of bins is a distribution and that support_to_scalar inverts the transformation
+        """
+        np.random.seed(0)
+        support_size = 20
+
+        for shape in [(16, ), (6, 16), (3, 4, 5)]:
+            scalars = np.random.randn(*shape) * 50
+            support = scalar_to_support(scalars, support_size)
+
+            self.assertEqual(support.shape, (*shape, 2 * support_size + 1))
+            self.assertEqual(support.dtype, np.float32)
+
+            rows = [scalar_to_support(row, support_size) for row in scalars.reshape(-1, shape[-1])]
+            np.testing.assert_array_almost_equal(support.reshape(-1, shape[-1], 2 * support_size + 1), rows)
+
+            np.testing.assert_array_almost_equal(np.sum(support, axis=-1), np.ones(shape), decimal=5)
+            np.testing.assert_allclose(support_to_scalar(support, support_size), scalars, rtol=1e-3, atol=1e-3)
+
+    def test_scalar_to_support_example(self):
+        """ Test bin creation explicitly against a manually calculated example. """
+        scalars = np.array([[-2.5, -0.75, 0.2], [1.38, 2.99, 0.0]])
+        expected = np.array([
+            [[0.5, 0.5, 0, 0, 0, 0, 0], [0, 0, 0.75, 0.25, 0, 0, 0], [0, 0, 0, 0.8, 0.2, 0, 0]],
+            [[0, 0, 0, 0, 0.62, 0.38, 0], [0, 0, 0, 0, 0, 0.01, 0.99], [0, 0, 0, 1, 0, 0, 0]]
+        ])
+
+        support = scalar_to_support(scalars, 3, reward_transformer=lambda x: x)
+        np.testing.assert_array_almost_equal(support, expected, decimal=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
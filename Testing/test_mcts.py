@@ -0,0 +1,102 @@
+"""
+Python code to test the batched MuZero MCTS against the recursive (unbatched) tree search.
+
+Both searches are run on the default Gym (CartPole) architecture from the same root on a fixed seed.
+Run from the repository root: python -m unittest discover -s Testing
+"""
+import unittest
+
+import numpy as np
+
+from MuZero.MuMCTS import MuZeroMCTS
+from Testing import GymMuZeroTestCase
+
+from utils.selfplay_utils import GameHistory
+
+
+class TestMuZeroMCTS(GymMuZeroTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.mcts = MuZeroMCTS(self.g, self.net, self.config.args)
+
+        self.state = self.g.getInitialState()
+        self.trajectory = GameHistory()
+
+    def initialize(self) -> tuple:
+        """ Clear the tree and embed the root state with the same Dirichlet noise for every search. """
+        np.random.seed(1)
+        self.mcts.minmax.refresh()
+        self.mcts.clear_tree()
+        return self.mcts.initialize_root(self.state, self.trajectory)
+
+    def test_batch_size_one(self):
+        """
+        Tests that _search_batched with a batch size of one equals repeated calls to the recursive _search:
+         - Assert the same summed backed-up value
+         - Assert equal visit counts and Q-values for every edge in the tree
+        """
+        n = 50
+        s_0, latent_state, _ = self.initialize()
+        v_search = sum([self.mcts._search(latent_state) for _ in range(n)])
+        Nsa, Qsa, Ns = dict(self.mcts.Nsa), dict(self.mcts.Qsa), dict(self.mcts.Ns)
+
+        s_0, latent_state, _ = self.initialize()
+        v_batched = self.mcts._search_batched(latent_state, n, 1)
+
+        self.assertAlmostEqual(v_search, v_batched, places=5)
+        self.assertEqual(Nsa, self.mcts.Nsa)
+        self.assertEqual(Ns, self.mcts.Ns)
+        self.assertEqual(Qsa.keys(), self.mcts.Qsa.keys())
+        for edge, q in Qsa.items():
+            self.assertAlmostEqual(q, self.mcts.Qsa[edge], places=5)
+        self.assertFalse(self.mcts.VLsa)
+
+    def test_batched_visit_counts(self):
+        """
+        Tests that _search_batched performs exactly 'num_simulations' searches for batch sizes larger than one:
+         - Assert that the root and its edges are visited once per simulation
+         - Assert that all virtual losses are removed after the search
+        """
+        n = 50
+        for batch_size in [4, 16, 64]:
+            s_0, latent_state, _ = self.initialize()
+            self.mcts._search_batched(latent_state, n, batch_size)
+
+            self.assertEqual(self.mcts.Ns[s_0], n)
+            self.assertEqual(sum(self.mcts.Nsa.get((s_0, a), 0) for a in range(self.g.getActionSize())), n)
+            self.assertFalse(self.mcts.VLsa)
+
+    def test_transposition_lifetime(self):
+        """
+        Tests that the transposition table is kept across the searches of an episode:
+         - Assert that runMCTS keeps the stored predictions while the weights are unchanged
+         - Assert that runMCTS clears the table after a weight update, and that clear_tree always clears it
+        """
+        self.mcts.transposition_size = 100
+        self.mcts.runMCTS(self.state, self.trajectory)
+        self.assertTrue(self.mcts.transpositions)
+
+        self.mcts.store_transposition(b'sentinel', 0, (0.0, None, None, 0.0))
+        self.mcts.runMCTS(self.state, self.trajectory)
+        self.assertIsNotNone(self.mcts.lookup_transposition(b'sentinel', 0))
+
+        self.net.steps += 1
+        self.mcts.runMCTS(self.state, self.trajectory)
+        self.assertIsNone(self.mcts.lookup_transposition(b'sentinel', 0))
+
+        self.mcts.clear_tree()
+        self.assertFalse(self.mcts.transpositions)
+
+    def test_run_mcts_batched(self):
+        """ Tests that runMCTS with mcts_batch_size > 1 returns a distribution over the visit counts of the root. """
+        self.mcts.args.mcts_batch_size = 4
+        pi, v = self.mcts.runMCTS(self.state, self.trajectory)
+
+        self.assertEqual(len(pi), self.g.getActionSize())
+        self.assertAlmostEqual(np.sum(pi), 1.0, places=5)
+        self.assertTrue(np.isfinite(v))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+Python code to test the MuZero neural network implementation on the default Gym (CartPole) architecture.
+
+The batched/ compiled code paths are compared against their unbatched or float equivalents on fixed seeds.
+Run from the repository root: python -m unittest discover -s Testing
+"""
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+
+from Testing import GymMuZeroTestCase
+
+from utils.loss_utils import scalar_to_support, cast_to_tensor
+from utils.network_utils import QuantizedModel
+
+
+class TestMuZeroNetwork(GymMuZeroTestCase):
+
+    def random_latent_batch(self, n: int) -> tuple:
+        """ Generate n latent states from random observations together with n random integer actions. """
+        observations = np.random.randn(n, *self.g.getDimensions()).astype(np.float32)
+        latent_states = np.asarray(self.net.neural_net.encoder.predict_on_batch(observations))
+        return latent_states, np.random.randint(self.g.getActionSize(), size=n)
+
+    def random_batch(self, n: int, k: int) -> tuple:
+        """ Generate a random training batch of n samples with k unroll steps as returned by MuZeroCoach. """
+        dimensions, action_size = self.g.getDimensions(), self.g.getActionSize()
+
+        observations = np.random.randn(n, *dimensions).astype(np.float32)
+        actions = np.random.randint(action_size, size=(n, k))
+        targets = (np.random.randn(n, k + 1) * 10, np.random.randn(n, k + 1),
+                   np.random.dirichlet(np.ones(action_size), size=(n, k + 1)))
+        forward_observations = np.random.randn(n, k, *dimensions).astype(np.float32)
+
+        return observations, actions, targets, forward_observations, np.ones(n) / n
+
+    def test_finite_loss(self):
+        """
+        Tests that the unrolled loss is finite for a categorical value/ reward support (support_size > 0):
+         - Assert that the total loss and all piecewise losses are finite
+         - Assert that the reward loss of the root (k = 0) is zero
+        """
+        self.assertGreater(self.config.net_args.support_size, 0)
+        self.assertTrue(self.net.fit_rewards)
+
+        observations, actions, (vs, rs, pis), forward_observations, sample_weight = self.random_batch(8, 5)
+        support_size = self.config.net_args.support_size
+
+        # Format the data as in DefaultMuZero.train.
+        data = [cast_to_tensor(x) for x in [observations, scalar_to_support(vs.T, support_size),
+                                            scalar_to_support(rs.T, support_size), np.swapaxes(pis, 0, 1),
+                                            forward_observations, sample_weight]]
+        data.insert(1, tf.convert_to_tensor(actions, dtype=tf.int32))
+
+        loss, (v_loss, r_loss, pi_loss, absorb_k) = self.net.loss_function(*data)
+        self.assertTrue(np.isfinite(loss.numpy()))
+        for x in [v_loss, r_loss, pi_loss]:
+            self.assertTrue(np.all(np.isfinite(x.numpy())))
+        np.testing.assert_array_equal(r_loss[0], 0)
+
+    def test_checkpoint_round_trip(self):
+        """
+        Tests that the single-file HDF5 checkpoint restores the weights of every model into a fresh network:
+         - Assert that the fresh network initially differs from the saved network
+         - Assert equal weights for every stored model and equal inference after loading
+         - Assert that loading a missing checkpoint raises a FileNotFoundError
+        """
+        observations = np.random.randn(4, *self.g.getDimensions()).astype(np.float32)
+        other = self.build_network()
+
+        with tempfile.TemporaryDirectory() as folder:
+            self.net.save_checkpoint(folder, 'checkpoint.h5')
+
+            self.assertFalse(np.allclose(self.net.initial_inference_batch(observations)[0],
+                                         other.initial_inference_batch(observations)[0]))
+            other.load_checkpoint(folder, 'checkpoint.h5')
+
+            with self.assertRaises(FileNotFoundError):
+                other.load_checkpoint(folder, 'missing.h5')
+
+        models, loaded = self.net._checkpoint_models(), other._checkpoint_models()
+        self.assertEqual(models.keys(), loaded.keys())
+        for name in models:
+            for x, y in zip(models[name].get_weights(), loaded[name].get_weights()):
+                np.testing.assert_array_equal(x, y)
+
+        for x, y in zip(self.net.initial_inference_batch(observations), other.initial_inference_batch(observations)):
+            np.testing.assert_array_almost_equal(x, y)
+
+    def test_adam_weight_decay_fallback(self):
+        """
+        Tests the decoupled weight decay of the 'adamw' option on tensorflow versions without AdamW (TF < 2.11):
+         - Assert that the network falls back to Adam with a manual weight decay
+         - Assert that one step with zero gradients equals w - lr * weight_decay * w (the Adam update is zero)
+        """
+        self.config.net_args.optimizer.method = 'adamw'
+        self.config.net_args.optimizer.weight_decay = 0.1
+        with mock.patch.dict(vars(tf.keras.optimizers)):
+            del vars(tf.keras.optimizers)['AdamW']
+            net = self.build_network()
+
+        self.assertNotIsInstance(net.optimizer, tf.keras.optimizers.AdamW)
+        self.assertEqual(net.weight_decay, 0.1)
+
+        # Zero sample weights give a zero loss and zero gradients, as the l2 penalty is omitted for decoupled decay.
+        observations, actions, targets, forward_observations, sample_weight = self.random_batch(8, 5)
+        weights = [x.numpy() for x in net.get_variables()]
+        net.train((observations, actions, targets, forward_observations, np.zeros_like(sample_weight)))
+
+        decay = float(net.optimizer.learning_rate) * net.weight_decay
+        for w, x in zip(weights, net.get_variables()):
+            np.testing.assert_allclose(x.numpy(), w - decay * w, rtol=1e-6, atol=1e-7)
+
+    def test_int8_recurrent_inference(self):
+        """
+        Tests that the int8 quantized recurrent model returns its outputs in the order of the float model:
+         - Assert that every output has the shape of the corresponding float output (also after batch resizing)
+         - Assert that the dequantized outputs are close to the float outputs on the same input
+         - Assert that recurrent inference through the quantized model yields the shapes of float inference
+        """
+        latent_states, actions = self.random_latent_batch(32)
+        action_planes = np.eye(self.g.getActionSize())[actions]
+
+        model = self.net.neural_net.recurrent
+        quantized = QuantizedModel(model, [latent_states, action_planes])
+
+        float_outputs = model.predict_on_batch([latent_states, action_planes])
+        for n in [32, 1, 32]:
+            int8_outputs = quantized.predict_on_batch([latent_states[:n], action_planes[:n]])
+            for x, y in zip(float_outputs, int8_outputs):
+                self.assertEqual(np.shape(x[:n]), np.shape(y))
+                np.testing.assert_allclose(x[:n], y, atol=0.05)
+
+        float_predictions = self.net.recurrent_inference_batch(latent_states, actions)
+        self.net.quantize_inference = True
+        int8_predictions = self.net.recurrent_inference_batch(latent_states, actions)
+        for x, y in zip(float_predictions, int8_predictions):
+            self.assertEqual(np.shape(x), np.shape(y))
+
+    def test_int8_arena_calibration(self):
+        """
+        Tests that an opponent network that only loads checkpoints is quantized like the trained network:
+         - Assert that the opponent only quantizes weights without a calibration batch
+         - Assert that both recurrent models are calibrated when the opponent shares the trained network's batches
+        """
+        self.net.quantize_inference = True
+        self.net.train(self.random_batch(8, 5))
+
+        opponent = self.build_network()
+        opponent.quantize_inference = True
+        with tempfile.TemporaryDirectory() as folder:
+            self.net.save_checkpoint(folder, 'checkpoint.h5')
+
+            opponent.load_checkpoint(folder, 'checkpoint.h5')
+            self.assertTrue(self.net.get_recurrent_model().calibrated)
+            self.assertFalse(opponent.get_recurrent_model().calibrated)
+
+            opponent.calibration_net = self.net  # As done by MuZeroCoach for pitting.
+            opponent.load_checkpoint(folder, 'checkpoint.h5')
+            self.assertTrue(opponent.get_recurrent_model().calibrated)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+Python code to test the request/ response protocol of the parallel MuZero self-play workers.
+
+The InferenceServer is driven with a deterministic stub network, whose batched answers are compared against
+answering every query on its own.
+Run from the repository root: python -m unittest discover -s Testing
+"""
+import contextlib
+import io
+import threading
+import typing
+import unittest
+
+import numpy as np
+
+from MuZero.MuSelfPlay import InferenceServer, execute_episodes_parallel, INITIAL, RECURRENT
+
+from utils import DotDict
+from utils.selfplay_utils import GameHistory
+
+
+class StubNetwork:
+    """ Deterministic stand-in for DefaultMuZero's batched inference that records the size of every call. """
+
+    def __init__(self, action_size: int = 3) -> None:
+        self.net_args = DotDict({'observation_length': 1})
+        self.steps = 0
+        self.action_size = action_size
+        self.calls = list()
+
+    def initial_inference_batch(self, observations: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        self.calls.append((INITIAL, len(observations)))
+        s_0 = observations.reshape(len(observations), -1) * 2
+        return s_0, np.tile(np.arange(self.action_size), (len(s_0), 1)) + s_0[:, :1], np.sum(s_0, axis=1)
+
+    def recurrent_inference_batch(self, latent_states: np.ndarray, actions: np.ndarray) -> \
+            typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        self.calls.append((RECURRENT, len(latent_states)))
+        s_next = latent_states + actions[:, None]
+        return np.sum(latent_states, axis=1), s_next, np.eye(self.action_size)[actions], actions * 10.0
+
+
+class StubSearchEngine:
+    """ Search engine stand-in with the constructor and clear_tree of MuZeroMCTS. """
+
+    def __init__(self, game, neural_net, args: DotDict) -> None:
+        self.neural_net = neural_net
+
+    def clear_tree(self) -> None:
+        pass
+
+
+class StubCoach:
+    """ Coach stand-in whose episodes perform one initial and one recurrent inference query each. """
+
+    def __init__(self, fail: bool = False) -> None:
+        self.game, self.args, self.fail = None, DotDict(), fail
+        self.neural_net = StubNetwork()
+        self.mcts = StubSearchEngine(self.game, self.neural_net, self.args)
+
+    def executeEpisode(self) -> GameHistory:
+        if self.fail:
+            raise ValueError("Failing self-play episode.")
+
+        s_0, pi, v = self.mcts.neural_net.initial_inference(np.random.randn(2, 2))
+        r, s_1, pi_1, v_1 = self.mcts.neural_net.recurrent_inference(s_0, 1)
+
+        history = GameHistory()
+        history.observations += [s_0, s_1]
+        history.rewards.append(r)
+        return history
+
+
+class TestInferenceServer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        np.random.seed(0)
+        self.net = StubNetwork()
+        self.server = InferenceServer(self.net, num_workers=4, max_wait=5.0)
+
+    def test_serve_mixed_queries(self):
+        """
+        Tests that one call to serve answers mixed INITIAL/ RECURRENT queries of all workers in one batch each:
+         - Assert one batched network call per query type containing all queried samples
+         - Assert that every worker receives exactly the predictions for its own query (np.split fan-out)
+        """
+        queries = {
+            0: (INITIAL, np.random.randn(2, 2)),
+            1: (RECURRENT, (np.random.randn(2, 4), np.array([0, 2]))),
+            2: (INITIAL, np.random.randn(2, 2)),
+            3: (RECURRENT, (np.random.randn(3, 4), np.array([1, 1, 2]))),
+        }
+        for worker_id, (kind, query) in queries.items():
+            self.server.requests.put((worker_id, kind, query))
+
+        self.server.serve(num_active=len(queries), timeout=5.0)
+        self.assertEqual(sorted(self.net.calls), [(INITIAL, 2), (RECURRENT, 5)])
+
+        for worker_id, (kind, query) in queries.items():
+            response = self.server.responses[worker_id].get(timeout=5.0)
+            if kind == INITIAL:
+                expected = [x[0] for x in self.net.initial_inference_batch(query[np.newaxis, ...])]
+            else:
+                expected = self.net.recurrent_inference_batch(*query)
+
+            self.assertEqual(len(response), len(expected))
+            for x, y in zip(response, expected):
+                np.testing.assert_array_almost_equal(x, y)
+
+    def test_clients(self):
+        """
+        Tests the InferenceClient round-trip of concurrent workers through the InferenceServer:
+         - Assert that every client receives the unbatched predictions of the network for its query
+        """
+        observations = np.random.randn(2, 2, 2)
+        latent_states, actions = np.random.randn(2, 4), np.array([2, 0])
+        results = dict()
+
+        def query(worker_id: int) -> None:
+            client = self.server.client(worker_id)
+            if worker_id < 2:
+                results[worker_id] = client.initial_inference(observations[worker_id])
+            else:
+                results[worker_id] = client.recurrent_inference(latent_states[worker_id - 2], actions[worker_id - 2])
+
+        threads = [threading.Thread(target=query, args=(i, )) for i in range(4)]
+        for t in threads:
+            t.start()
+        self.server.serve(num_active=4, timeout=5.0)
+        for t in threads:
+            t.join(timeout=5.0)
+
+        for i in range(2):
+            s_0, pi, v = self.net.initial_inference_batch(observations[i][np.newaxis, ...])
+            np.testing.assert_array_almost_equal(results[i][0], s_0[0])
+            np.testing.assert_array_almost_equal(results[i][1], pi[0])
+            self.assertAlmostEqual(results[i][2], v[0])
+
+        for i in range(2):
+            r, s_next, pi, v = self.net.recurrent_inference_batch(latent_states[i:i + 1], actions[i:i + 1])
+            self.assertAlmostEqual(results[i + 2][0], r[0])
+            np.testing.assert_array_almost_equal(results[i + 2][1], s_next[0])
+            np.testing.assert_array_almost_equal(results[i + 2][2], pi[0])
+            self.assertAlmostEqual(results[i + 2][3], v[0])
+
+
+class TestExecuteEpisodesParallel(unittest.TestCase):
+
+    def test_episodes(self):
+        """ Tests that n episodes are returned by the forked workers and are played with the server's answers. """
+        histories = list(execute_episodes_parallel(StubCoach(), n=5, num_workers=2))
+
+        self.assertEqual(len(histories), 5)
+        for history in histories:
+            s_0, s_1 = history.observations
+            np.testing.assert_array_almost_equal(s_1, s_0 + 1)  # Dynamics of the stub network for action 1.
+            self.assertAlmostEqual(history.rewards[0], np.sum(s_0))
+
+    def test_worker_failure(self):
+        """ Tests that an exception within a worker process surfaces as a RuntimeError in the main process. """
+        with self.assertRaises(RuntimeError), contextlib.redirect_stderr(io.StringIO()):  # Silence worker tracebacks.
+            list(execute_episodes_parallel(StubCoach(fail=True), n=2, num_workers=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+"""
+Python code to test the batched replay buffer against the per-sample GameHistory implementation.
+
+The vectorized data gathering is compared on a fixed seed against the slicing of the GameHistory lists.
+Run from the repository root: python -m unittest discover -s Testing
+"""
+import types
+import typing
+import unittest
+
+import numpy as np
+
+from MuZero.MuCoach import MuZeroCoach
+
+from utils import DotDict
+from utils.selfplay_utils import GameHistory, TrajectoryBuffer, sample_batch
+
+
+def random_histories(n: int, action_size: int = 3, observation_shape: tuple = (2, 2, 1),
+                     max_length: int = 12) -> typing.List[GameHistory]:
+    """ Generate n finished GameHistory objects of random lengths with random data. """
+    histories = list()
+    for length in np.random.randint(1, max_length, size=n):
+        history = GameHistory()
+        for _ in range(length):
+            history.observations.append(np.random.randn(*observation_shape))
+            history.actions.append(np.random.randint(action_size))
+            history.players.append(1)
+            history.probabilities.append(np.random.dirichlet(np.ones(action_size)))
+            history.rewards.append(np.random.randn())
+            history.search_returns.append(np.random.randn())
+        history.terminate()
+        history.compute_returns(gamma=0.9, n=5)
+        histories.append(history)
+
+    return histories
+
+
+def hypothetical_steps(history: GameHistory, t: int, k: int) -> typing.Tuple[np.ndarray, typing.Tuple]:
+    """ Per-sample reference of MuZeroCoach.buildHypotheticalSteps by slicing the lists of the GameHistory. """
+    actions = history.actions[t:t + k]
+
+    pis = history.probabilities[t:t + k + 1]
+    vs = history.observed_returns[t:t + k + 1]
+    rewards = history.rewards[t:t + k + 1]
+
+    t_truncation = (k + 1) - len(pis)
+    if t_truncation > 0:
+        pis += [np.zeros_like(pis[-1])] * t_truncation
+        rewards += [0] * t_truncation
+        vs += [0] * t_truncation
+
+    return np.asarray(actions), (np.asarray(vs), np.asarray(rewards), np.asarray(pis))
+
+
+def sample_coordinates(histories: typing.List[GameHistory], n: int, prioritize: bool, alpha: float,
+                       beta: float) -> typing.List[typing.Tuple[int, int, float]]:
+    """ Per-sample reference of sample_batch that maps each flat index to its history with a linear scan. """
+    lengths = list(map(len, histories))
+
+    sampling_probability = None
+    sample_weight = np.ones(np.sum(lengths))
+    if prioritize:
+        errors = np.array([np.abs(h.search_returns[i] - h.observed_returns[i])
+                           for h in histories for i in range(len(h))])
+        sampling_probability = np.power(errors, alpha) / np.sum(np.power(errors, alpha))
+        sample_weight = np.power(n * sampling_probability, beta)
+
+    flat_indices = np.random.choice(a=np.sum(lengths), size=n, replace=(n > np.sum(lengths)), p=sampling_probability)
+
+    borders = np.cumsum(lengths)
+    coordinates = list()
+    for i in flat_indices:
+        h_i = np.sum(i >= borders)
+        coordinates.append((h_i, i - np.r_[0, borders][h_i], sample_weight[i]))
+
+    return coordinates
+
+
+class TestTrajectoryBuffer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        np.random.seed(0)
+        self.action_size = 3
+        self.histories = random_histories(10, action_size=self.action_size)
+        self.buffer = TrajectoryBuffer.from_histories(self.histories)
+
+        # All coordinates (h_i, t) within the buffer, including the terminal time point of each trajectory.
+        self.h_i, self.t = np.asarray([(h_i, t) for h_i, h in enumerate(self.histories)
+                                       for t in range(len(h) + 1)]).T
+
+    def test_stack_observations(self):
+        """
+        Tests that batched observation stacking equals GameHistory.stackObservations for every (h_i, t):
+         - Assert equality for observation lengths smaller, equal, and larger than the trajectories
+         - Assert that time points beyond the end of a trajectory repeat the terminal observation
+        """
+        inside = self.t < self.buffer.lengths[self.h_i]  # GameHistory only stacks t < T for lengths > 1.
+        for length in [3, 15]:
+            stacked = self.buffer.stackObservations(self.h_i[inside], self.t[inside], length)
+            for i, (h_i, t) in enumerate(zip(self.h_i[inside], self.t[inside])):
+                expected = self.histories[h_i].stackObservations(length, t=t)
+                np.testing.assert_array_almost_equal(stacked[i], expected)
+
+        stacked = self.buffer.stackObservations(self.h_i, self.t + 2, 1)
+        for i, (h_i, t) in enumerate(zip(self.h_i, self.t + 2)):
+            np.testing.assert_array_almost_equal(stacked[i], self.histories[h_i].stackObservations(1, t=t))
+
+    def test_forward_observations(self):
+        """
+        Tests that the batched forward observations equal the per-sample GameHistory stacks at t + 1, ..., t + k:
+         - Assert the shape (batch_size, k, ...) of the gathered future observations
+         - Assert equality, including time points beyond the end of a trajectory
+        """
+        k = 5
+        forward_observations = self.buffer.stackObservationsRange(self.h_i, self.t, k, 1)
+        self.assertEqual(forward_observations.shape[:2], (len(self.h_i), k))
+
+        expected = np.asarray([[self.histories[h_i].stackObservations(1, t=t + j + 1) for j in range(k)]
+                               for h_i, t in zip(self.h_i, self.t)])
+        np.testing.assert_array_almost_equal(forward_observations, expected)
+
+    def test_hypothetical_steps(self):
+        """
+        Tests that the batched target gathering of MuZeroCoach.buildHypotheticalSteps equals per-sample slicing:
+         - Assert equal value, reward, and policy targets (zero padded beyond the terminal state)
+         - Assert equal actions until the terminal state and valid random actions beyond
+        """
+        k = 5
+        coach = MuZeroCoach.__new__(MuZeroCoach)  # Only the helper variables for buildHypotheticalSteps are needed.
+        coach._arange_k, coach._action_size = np.arange(k + 1), self.action_size
+
+        actions, (vs, rewards, pis) = coach.buildHypotheticalSteps(self.buffer, self.h_i, self.t, k)
+        self.assertEqual(actions.shape, (len(self.h_i), k))
+        self.assertTrue(np.all((0 <= actions) & (actions < self.action_size)))
+
+        for i, (h_i, t) in enumerate(zip(self.h_i, self.t)):
+            expected_actions, (expected_vs, expected_rewards, expected_pis) = \
+                hypothetical_steps(self.histories[h_i], t, k)
+
+            np.testing.assert_array_equal(actions[i, :len(expected_actions)], expected_actions)
+            np.testing.assert_array_almost_equal(vs[i], expected_vs, decimal=5)
+            np.testing.assert_array_almost_equal(rewards[i], expected_rewards, decimal=5)
+            np.testing.assert_array_almost_equal(pis[i], expected_pis, decimal=5)
+
+
+class TestSampleBatch(unittest.TestCase):
+
+    def test_sample_coordinates(self):
+        """
+        Tests that the sorted and vectorized sample_batch equals mapping each sampled index to its history:
+         - Assert the same (history, time, weight) samples for uniform and prioritized sampling on a fixed seed
+         - Assert that the coordinates are sorted by history and time point
+        """
+        np.random.seed(0)
+        histories = random_histories(20)
+
+        for prioritize, n in [(False, 64), (True, 64), (False, 1000)]:
+            np.random.seed(1)
+            coordinates, weights = sample_batch(histories, n, prioritize=prioritize, alpha=0.5, beta=1.0)
+            np.random.seed(1)
+            expected = sample_coordinates(histories, n, prioritize=prioritize, alpha=0.5, beta=1.0)
+
+            self.assertEqual([tuple(x) for x in coordinates], sorted(x[:2] for x in expected))
+            np.testing.assert_array_almost_equal(weights, [w for *_, w in sorted(expected)])
+
+
+class TestSampleBatches(unittest.TestCase):
+
+    @staticmethod
+    def batch_coach(batch_size: int, k: int, forward_observations: bool) -> MuZeroCoach:
+        """ Get a MuZeroCoach with only the helper variables for sampleBatch(es) (no network or search engine). """
+        coach = MuZeroCoach.__new__(MuZeroCoach)
+        coach.args = DotDict({'K': k, 'prioritize': False, 'prioritize_alpha': 0.5, 'prioritize_beta': 1.0})
+        coach.neural_net = types.SimpleNamespace(net_args=DotDict({'batch_size': batch_size}))
+        coach.return_forward_observations, coach.observation_stack_length = forward_observations, 2
+        coach._arange_k, coach._action_size = np.arange(k + 1), 3
+        coach._buffer = coach._buffer_source = None
+        return coach
+
+    def test_sample_batches(self):
+        """
+        Tests that the tf.data pipeline of sampleBatches yields the batches of sampleBatch:
+         - Assert that exactly n batches are yielded
+         - Assert integer actions, float32 observations/ targets/ weights, and the shapes of sampleBatch
+         - Assert empty (batch_size, 0) forward observations if these are not used
+        """
+        np.random.seed(0)
+        histories = random_histories(10)
+        batch_size, k, n = 16, 5, 7
+
+        for forward_observations in [False, True]:
+            coach = self.batch_coach(batch_size, k, forward_observations)
+            observations, actions, targets, forward, sample_weight = coach.sampleBatch(histories)
+            expected_shapes = [np.shape(x) for x in [observations, actions, *targets, forward, sample_weight]]
+
+            batches = list(coach.sampleBatches(histories, n))
+            self.assertEqual(len(batches), n)
+
+            for observations, actions, targets, forward, sample_weight in batches:
+                batch = [observations, actions, *targets, forward, sample_weight]
+                self.assertEqual([x.shape for x in batch], expected_shapes)
+
+                self.assertEqual(actions.dtype, np.int32)
+                for x in [observations, *targets, forward, sample_weight]:
+                    self.assertEqual(x.dtype, np.float32)
+
+                self.assertEqual(actions.shape, (batch_size, k))
+                if not forward_observations:
+                    self.assertEqual(forward.shape, (batch_size, 0))
+                else:
+                    self.assertEqual(forward.shape[:2], (batch_size, k))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -42,14 +42,18 @@ class Monitor(ABC):
     def __init__(self, reference):
         self.reference = reference  # Instance of a Neural Network framework to track statistics on.
 
+    def should_log(self) -> bool:
+        """ Whether statistics are recorded at the current number of backpropagation steps (every LOG_RATE steps) """
+        return self.reference.steps % LOG_RATE == 0
+
     def log(self, tensor: typing.Union[tf.Tensor, float], name: str) -> None:
         """ Log a scalar annotated by the number of backpropagation steps """
-        if self.reference.steps % LOG_RATE == 0:
+        if self.should_log():
             tf.summary.scalar(name, data=tensor, step=self.reference.steps)
 
     def log_distribution(self, tensor: typing.Union[tf.Tensor, np.ndarray], name: str) -> None:
         """ Log an array of scalars annotated by the number of backpropagation steps """
-        if self.reference.steps % LOG_RATE == 0:
+        if self.should_log():
             tf.summary.histogram(name, tensor, step=self.reference.steps)
 
     @abstractmethod
@@ -66,19 +70,28 @@ class MuZeroMonitor(Monitor):
     def __init__(self, reference):
         super().__init__(reference)
 
-    def log_recurrent_losses(self, t: int, v_loss: tf.Tensor, r_loss: tf.Tensor, pi_loss: tf.Tensor,
+    def log_recurrent_losses(self, v_loss: tf.Tensor, r_loss: tf.Tensor, pi_loss: tf.Tensor,
                              absorb: tf.Tensor, o_loss: tf.Tensor = None) -> None:
-        """ Log each prediction head loss from the MuZero RNN as a scalar (optionally includes decoder loss). """
+        """
+        Log each prediction head loss from the MuZero RNN as a scalar for every unrolled step k = 0...K
+        (optionally includes decoder loss). The losses are given as stacked (K + 1 x batch_size) tensors and are
+        reduced over the batch for all steps at once.
+        """
         step = self.reference.steps
-        if self.reference.steps % LOG_RATE == 0:
-            tf.summary.scalar(f"r_loss_{t}", data=tf.reduce_mean(r_loss), step=step)
-            tf.summary.scalar(f"v_loss_{t}", data=tf.reduce_mean(v_loss), step=step)
-            tf.summary.scalar(f"pi_loss_{t}", data=tf.reduce_sum(pi_loss) / tf.reduce_sum(1 - absorb), step=step)
-
+        if self.should_log():
+            losses = {
+                'r_loss': tf.reduce_mean(r_loss, axis=1),
+                'v_loss': tf.reduce_mean(v_loss, axis=1),
+                'pi_loss': tf.reduce_sum(pi_loss, axis=1) / tf.reduce_sum(1 - absorb, axis=1)
+            }
             if o_loss is not None:  # Decoder option.
-                tf.summary.scalar(f"decode_loss_{t}", data=tf.reduce_mean(o_loss), step=step)
+                losses['decode_loss'] = tf.reduce_mean(o_loss, axis=1)
 
-    def log_batch(self, data_batch: typing.List) -> None:
+            for name, loss in losses.items():
+                for t, loss_t in enumerate(loss.numpy()):
+                    tf.summary.scalar(f"{name}_{t}", data=loss_t, step=step)
+
+    def log_batch(self, data_batch: typing.Tuple) -> None:
         """
         Log a large amount of neural network statistics based on the given batch.
         Functionality can be toggled on by specifying '--debug' as a console argument to Main.py.
@@ -92,15 +105,14 @@ class MuZeroMonitor(Monitor):
          - Divergence between the dynamics and encoder functions.
          - Squared error of the decoding function.
         """
-        if DEBUG_MODE and self.reference.steps % LOG_RATE == 0:
-            observations, actions, targets, forward_observations, sample_weight = list(zip(*data_batch))
-            actions, sample_weight = np.asarray(actions), np.asarray(sample_weight)
-            target_vs, target_rs, target_pis = list(map(np.asarray, zip(*targets)))
+        if DEBUG_MODE and self.should_log():
+            observations, actions, targets, forward_observations, sample_weight = data_batch
+            target_vs, target_rs, target_pis = targets
 
-            priority = sample_weight * len(data_batch)  # Undo 1/n scaling to get priority
+            priority = sample_weight * len(sample_weight)  # Undo 1/n scaling to get priority
             tf.summary.histogram(f"sample probability", data=priority, step=self.reference.steps)
 
-            s, pi, v = self.reference.neural_net.forward.predict_on_batch(np.asarray(observations))
+            s, pi, v = self.reference.neural_net.forward.predict_on_batch(observations)
 
             v_real = support_to_scalar(v, self.reference.net_args.support_size).ravel()
 
@@ -108,14 +120,17 @@ class MuZeroMonitor(Monitor):
             tf.summary.histogram(f"v_target_{0}", data=target_vs[:, 0], step=self.reference.steps)
             tf.summary.scalar(f"v_mse_{0}", data=np.mean((v_real - target_vs[:, 0]) ** 2), step=self.reference.steps)
 
-            # Sum over one-hot-encoded actions. If this sum is zero, then there is no action --> leaf node.
-            absorb_k = 1.0 - tf.reduce_sum(target_pis, axis=-1)
+            # Sum over target probabilities. If this sum is zero, then there is no action --> leaf node.
+            absorb_k = 1.0 - np.sum(target_pis, axis=-1)  # (batch_size x K + 1)
+
+            # One hot encode integer actions.
+            actions = np.eye(self.reference.action_size, dtype=np.float32)[actions]
 
             collect = list()
             for k in range(actions.shape[1]):
                 r, s, pi, v = self.reference.neural_net.recurrent.predict_on_batch([s, actions[:, k, :]])
 
-                collect.append((s, v, r, pi, absorb_k[k, :]))
+                collect.append((s, v, r, pi, absorb_k[:, k + 1]))
 
             for t, (s, v, r, pi, absorb) in enumerate(collect):
                 k = t + 1
@@ -135,12 +150,11 @@ class MuZeroMonitor(Monitor):
                 self.log(np.mean((r_real - target_rs[:, k]) ** 2), f"r_mse_{k}")
                 self.log(np.mean((v_real - target_vs[:, k]) ** 2), f"v_mse_{k}")
 
-            l2_norm = tf.reduce_sum([safe_l2norm(x) for x in self.reference.get_variables()])
+            l2_norm = tf.add_n([safe_l2norm(x) for x in self.reference.get_variables()])
             self.log(l2_norm, "l2 norm")
 
             # Option to track statistical properties of the dynamics model.
             if self.reference.net_args.dynamics_penalty > 0:
-                forward_observations = np.asarray(forward_observations)
                 # Compute statistics related to auto-encoding state dynamics:
                 for t, (s, v, r, pi, absorb) in enumerate(collect):
                     k = t + 1
@@ -183,7 +197,7 @@ class AlphaZeroMonitor(Monitor):
          - Values of each target/ prediction for the data batch.
          - Loss discrepancy between cross-entropy and MSE for the reward/ value predictions.
         """
-        if DEBUG_MODE and self.reference.steps % LOG_RATE == 0:
+        if DEBUG_MODE and self.should_log():
             observations, targets, sample_weight = list(zip(*data_batch))
             target_pis, target_vs = list(map(np.asarray, zip(*targets)))
             observations = np.asarray(observations)
@@ -25,12 +25,13 @@ def scalar_loss(prediction: typing.Union[tf.Tensor, np.ndarray],
                 target: typing.Union[tf.Tensor, np.ndarray]) -> typing.Union[tf.Tensor, float]:
     """
     Wrapper function to infer the correct loss function given the output representation.
+    The prediction may contain arbitrary leading axes, e.g., (K + 1, batch_size, ...) for stacked unrolling steps.
     :param prediction: tf.Tensor or np.ndarray Output of a neural network.
     :param target: tf.Tensor or np.ndarray Target output for a neural network.
     :return: tf.losses Loss function between target and prediction
     """
-    if np.prod(prediction.shape) == prediction.shape[0]:           # Implies (batch_size, 1) --> Regression
-        return tf.losses.mean_squared_error(target, prediction)
+    if prediction.shape[-1] == 1:                                  # Implies (..., batch_size, 1) --> Regression
+        return tf.losses.mean_squared_error(tf.reshape(target, tf.shape(prediction)), prediction)
 
     return tf.losses.categorical_crossentropy(target, prediction)  # Default: Cross Entropy
 
@@ -85,11 +86,11 @@ def scalar_to_support(x: np.ndarray, support_size: int,
     Cast a scalar or array of scalars to a distributional representation symmetric around 0.
     For example, the float 3.4 given a support size of 5 will create 11 bins for integers [-5, ..., 5].
     Each bin is assigned a probability value of 0, bins 4 and 3 will receive probabilities .4 and .6 respectively.
-    :param x: np.ndarray 1D-array of floats to be cast to distributional bins.
+    :param x: np.ndarray N-D array of floats to be cast to distributional bins.
     :param support_size: int Number of bins indicating integer range symmetric around zero.
     :param reward_transformer: Elementwise function to scale floats before casting them to bins.
     :param kwargs: Keyword arguments for reward_transformer.
-    :return: np.ndarray of size len(x) x (support_size * 2 + 1)
+    :return: np.ndarray of size x.shape x (support_size * 2 + 1)
     """
     if support_size == 0:  # Simple regression (support in this case can be the mean of a Gaussian)
         return x
@@ -99,9 +100,9 @@ def scalar_to_support(x: np.ndarray, support_size: int,
     floored = np.floor(transformed).astype(int)  # Lower-bound support integer
     prob = transformed - floored                 # Proportion between adjacent integers
 
-    bins = np.zeros((len(x), 2 * support_size + 1))
+    bins = np.zeros((*np.shape(x), 2 * support_size + 1), dtype=np.float32)
 
-    bins[np.arange(len(x)), floored + support_size] = 1 - prob
-    bins[np.arange(len(x)), floored + support_size + 1] = prob
+    np.put_along_axis(bins, (floored + support_size)[..., None], (1 - prob)[..., None], axis=-1)
+    np.put_along_axis(bins, (floored + support_size + 1)[..., None], prob[..., None], axis=-1)
 
     return bins
@@ -1,10 +1,12 @@
 """
 This file defines a Keras Layer to min-max normalize neuron activations sample-wise.
-Additionally, this file defines a helper class for constructing neural network substructures.
+Additionally, this file defines a helper class for constructing neural network substructures, and a wrapper
+for performing inference with an int8 quantized copy of a Keras Model.
 """
 import typing
 
 import numpy as np
+import tensorflow as tf
 from keras.layers import Layer, LeakyReLU, Activation, BatchNormalization, Dropout, Conv2D, Dense, Flatten, Lambda
 from keras import backend as k
 
@@ -16,13 +18,15 @@ class MinMaxScaler(Layer):
     The transformation is defined as:
         s = (s - min(s)) / (max(s) - min(s) + e)
     here s is the tensor passed to the layer, e is a small constant for numerical stability.
+
+    The layer always computes in float32, so that latent states are float32 under a mixed precision policy.
     """
 
     def __init__(self, epsilon: float = 1e-5) -> None:
         """
         :param epsilon: float additive constant in the division operator
         """
-        super().__init__()
+        super().__init__(dtype='float32')
         self.epsilon = epsilon
         self.shape = tuple()
 
@@ -100,3 +104,61 @@ class Crafter:
         flattened = Flatten()(conv_block)
         fc_sequence = self.dense_sequence(self.args.num_dense, flattened)
         return fc_sequence
+
+
+class QuantizedModel:
+    """
+    Post-training int8 quantized TF-Lite copy of a Keras Model for inference. The copy does not follow later
+    changes to the weights of the Keras Model, so it must be rebuilt after training.
+
+    If representative input data is given, both weights and activations are quantized to int8 (the model's
+    float inputs and outputs are quantized/ dequantized at the boundaries). Otherwise only the weights are quantized.
+
+    Inputs and outputs are matched to the Keras Model by name through the TF-Lite signature, the order of the
+    TF-Lite tensors themselves does not follow the order of the Keras Model.
+
+    Note: the Keras Model must be a tf.keras Model (keras >= 2.4), and TF-Lite must support signature runners.
+    """
+
+    def __init__(self, model, representative_data: typing.Optional[typing.List[np.ndarray]] = None) -> None:
+        """
+        Convert and load the quantized model.
+        :param model: Keras Model to quantize.
+        :param representative_data: Optional list of arrays with one batch of samples for each model input.
+        :raises: NotImplementedError if the model is no tf.keras Model or if TF-Lite has no signature runners.
+        """
+        if not QuantizedModel.supports(model):
+            raise NotImplementedError(f"Quantization requires a tf.keras Model and tensorflow >= 2.5, "
+                                      f"found {type(model)} and {tf.__version__}...")
+
+        # The signature keys inputs and outputs by the names of the Keras Model's input and output layers.
+        self.input_names = list(model.input_names)
+        self.output_names = list(model.output_names)
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if representative_data is not None:
+            # Samples are keyed by input name, a list would be matched to the signature inputs in sorted name order.
+            converter.representative_dataset = lambda: (
+                {name: x[i:i + 1].astype(np.float32) for name, x in zip(self.input_names, representative_data)}
+                for i in range(len(representative_data[0]))
+            )
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+        self.calibrated = representative_data is not None  # Whether activations are quantized as well.
+        self.interpreter = tf.lite.Interpreter(model_content=converter.convert())
+        self.runner = self.interpreter.get_signature_runner()
+
+    @staticmethod
+    def supports(model) -> bool:
+        """ Whether the given Keras Model can be converted by TF-Lite and run through its signature. """
+        return isinstance(model, tf.keras.Model) and hasattr(tf.lite.Interpreter, 'get_signature_runner')
+
+    def predict_on_batch(self, inputs: typing.List[np.ndarray]) -> typing.List[np.ndarray]:
+        """
+        Perform inference on a batch of data, equivalent to the Keras Model's predict_on_batch.
+        :param inputs: List of arrays with a batch of data for each model input.
+        :return: List of arrays with the batch of predictions for each model output.
+        """
+        outputs = self.runner(**{name: x.astype(np.float32) for name, x in zip(self.input_names, inputs)})
+        return [outputs[name] for name in self.output_names]
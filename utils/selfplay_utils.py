@@ -125,6 +125,70 @@ class GameHistory:
         return [subitem for item in nested_histories for subitem in item]
 
 
+@dataclass
+class TrajectoryBuffer:
+    """
+    Data container that concatenates a list of finished GameHistory objects into contiguous arrays.
+    Each trajectory is addressed by its offset within the flat arrays, this allows for gathering the data of an
+    entire batch of sample coordinates at once instead of slicing the lists of each GameHistory per sample.
+
+    Observations and actions contain T elements per trajectory, the targets contain T + 1 elements per trajectory
+    seeing as GameHistory.terminate appends the statistics of the terminal state.
+    """
+    observations: np.ndarray      # o_t: State observations of shape (sum_i T_i, *observation_shape)
+    actions: np.ndarray           # a_t+1: Actions of shape (sum_i T_i, )
+    probabilities: np.ndarray     # pi_t: MCTS probability vectors of shape (sum_i (T_i + 1), |action_space|)
+    rewards: np.ndarray           # u_t+1: Observed rewards of shape (sum_i (T_i + 1), )
+    observed_returns: np.ndarray  # z_t: Value targets of shape (sum_i (T_i + 1), )
+    lengths: np.ndarray           # T_i: Number of observations/ actions in each trajectory
+    target_lengths: np.ndarray    # T_i + 1: Number of targets in each trajectory
+    step_offsets: np.ndarray      # Start index of each trajectory within observations/ actions
+    target_offsets: np.ndarray    # Start index of each trajectory within probabilities/ rewards/ observed_returns
+
+    @staticmethod
+    def from_histories(histories: typing.List[GameHistory]) -> TrajectoryBuffer:
+        """ Concatenate the data of a list of finished GameHistory objects into one TrajectoryBuffer. """
+        lengths = np.array([len(h.observations) for h in histories])
+        target_lengths = np.array([len(h.probabilities) for h in histories])
+
+        return TrajectoryBuffer(
+            observations=np.concatenate([h.observations for h in histories], axis=0).astype(np.float32),
+            actions=np.concatenate([h.actions for h in histories]).astype(np.int64),
+            probabilities=np.concatenate([h.probabilities for h in histories], axis=0).astype(np.float32),
+            rewards=np.concatenate([h.rewards for h in histories]).astype(np.float32),
+            observed_returns=np.concatenate([h.observed_returns for h in histories]).astype(np.float32),
+            lengths=lengths,
+            target_lengths=target_lengths,
+            step_offsets=np.r_[0, np.cumsum(lengths)[:-1]],
+            target_offsets=np.r_[0, np.cumsum(target_lengths)[:-1]]
+        )
+
+    def stackObservations(self, h_i: np.ndarray, t: np.ndarray, length: int) -> np.ndarray:
+        """
+        Batched equivalent of GameHistory.stackObservations for the time points t within the trajectories h_i.
+        Observations before the start of a trajectory are zero vectors, observations beyond the end of a
+        trajectory are repeats of its terminal observation.
+        """
+        window = t[:, None] + np.arange(1 - max(length, 1), 1)           # (batch_size, length)
+        window = np.minimum(window, (self.lengths[h_i] - 1)[:, None])
+
+        stacked = self.observations[self.step_offsets[h_i][:, None] + np.maximum(window, 0)]
+        stacked[window < 0] = 0
+
+        # Concatenate along channel dimension: (batch_size, length, ..., c) -> (batch_size, ..., length * c)
+        stacked = np.moveaxis(stacked, 1, -2)
+        return stacked.reshape(*stacked.shape[:-2], -1)
+
+    def stackObservationsRange(self, h_i: np.ndarray, t: np.ndarray, k: int, length: int) -> np.ndarray:
+        """
+        Stack the observations for the k future time points t + 1, ..., t + k within the trajectories h_i with one
+        gather over a (batch_size * k, length) index matrix. Returns an array of shape (batch_size, k, ...).
+        """
+        future_t = (t[:, None] + np.arange(1, k + 1)).ravel()
+        stacked = self.stackObservations(np.repeat(h_i, k), future_t, length)
+        return stacked.reshape(len(h_i), k, *stacked.shape[1:])
+
+
 class MinMaxStats(object):
     """A class that keeps track of min-max statistics. """
 
@@ -239,6 +303,7 @@ def sample_batch(list_of_histories: typing.List[GameHistory], n: int, prioritize
     :param beta: float Exponentiation factor for the Importance Sampling ratio.
     :return: List of tuples indicating a sample, the first index in the tuple specifies which GameHistory object
              within list_of_histories is chosen and the second index specifies the time point within that GameHistory.
+             The coordinates are sorted by GameHistory and time point.
              List of scalars containing either the Importance Sampling ratio or 1 / N to scale the network loss with.
     """
     lengths = list(map(len, list_of_histories))   # Map the trajectory length of each Game
@@ -259,12 +324,17 @@ def sample_batch(list_of_histories: typing.List[GameHistory], n: int, prioritize
     # Sample with prioritized / uniform probabilities sample indices over the flattened list of GameHistory objects.
     flat_indices = np.random.choice(a=np.sum(lengths), size=n, replace=(n > np.sum(lengths)), p=sampling_probability)
 
+    # Sort the indices so that samples from the same GameHistory are gathered contiguously. The batch order
+    # does not matter for the (summed) loss.
+    flat_indices = np.sort(flat_indices)
+
     # Map the flat indices to the correct histories and history indices.
     history_index_borders = np.cumsum(lengths)
-    history_indices = [(np.sum(i >= history_index_borders), i) for i in flat_indices]
+    history_indices = np.searchsorted(history_index_borders, flat_indices, side='right')
+    time_indices = flat_indices - np.r_[0, history_index_borders][history_indices]
 
     # Of the form [(history_i, t), ...] \equiv history_it
-    sample_coordinates = [(h_i, i - np.r_[0, history_index_borders][h_i]) for h_i, i in history_indices]
+    sample_coordinates = list(zip(history_indices, time_indices))
     # Extract the corresponding IS loss scalars for each sample (or simply N x 1 / N if non-prioritized)
     sample_weights = sample_weight[flat_indices]
 